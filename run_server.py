@@ -6,8 +6,12 @@ Supports both stdio (Claude Desktop) and SSE (Zeabur/Web) transports
 import sys
 import os
 import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
 import datetime
+from pathlib import Path
 from typing import Optional
 
 # Determine transport mode from environment or command line
@@ -18,37 +22,108 @@ if TRANSPORT_MODE == "stdio":
 elif TRANSPORT_MODE != "sse":
     raise ValueError(f"Invalid MCP_TRANSPORT: {TRANSPORT_MODE}. Must be 'stdio' or 'sse'")
 
+import fastmcp
+import mcp as mcp_sdk
+
+from odoo_mcp.config import MCPConfig
 from odoo_mcp.server import mcp
 
+# Log directory next to this script, resolved and created once at import
+LOG_DIR = Path(__file__).resolve().parent / "logs"
+LOG_DIR.mkdir(exist_ok=True)
+
+# Environment variable prefixes echoed by log_diagnostics
+ENV_LOG_PREFIXES = ("ODOO_", "MCP_")
+
+# Resolved once at import for log_diagnostics
+FASTMCP_VERSION = getattr(fastmcp, "__version__", "unknown")
+MCP_SDK_VERSION = getattr(mcp_sdk, "__version__", "unknown")
+RUN_METHODS = tuple(
+    method
+    for method in ("run", "run_sse_async", "run_stdio_async", "run_streamable_http_async")
+    if hasattr(mcp, method)
+)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler that writes through a large buffer and never flushes per record"""
+
+    def _open(self):
+        return open(
+            self.baseFilename, self.mode, buffering=1 << 20,
+            encoding=self.encoding, errors=self.errors
+        )
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders asctime at most once per second (no milliseconds)"""
+
+    default_msec_format = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (second, rendered) swapped as one tuple so handler threads never see a torn pair
+        self._asctime_cache = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached = self._asctime_cache
+        if cached[0] != second:
+            cached = (second, super().formatTime(record, datefmt))
+            self._asctime_cache = cached
+        return cached[1]
+
+
+_logging_initialized = False
+
 
 def setup_logging():
-    """Set up logging to both console and file"""
-    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
-    os.makedirs(log_dir, exist_ok=True)
+    """Set up logging to both console and file (idempotent)"""
+    global _logging_initialized
+    if _logging_initialized:
+        return logging.getLogger()
+    _logging_initialized = True
 
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"mcp_server_{timestamp}.log")
+    log_file = LOG_DIR / f"mcp_server_{timestamp}.log"
 
-    # Configure logging
+    # Configure logging; records below LOG_LEVEL are dropped before formatting
+    level = getattr(logging, MCPConfig.from_env().log_level.upper(), logging.INFO)
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
 
-    # File handler
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.DEBUG)
+    # File handler: buffered, and fed from a queue by a background listener
+    # thread so that disk writes never block the event loop
+    file_handler = BufferedFileHandler(log_file)
+    file_handler.setLevel(level)
 
     # Format for both handlers
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     console_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
 
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Drain the queue before logging.shutdown() flushes and closes the file
+    atexit.register(file_handler.flush)
+    atexit.register(listener.stop)
+
     # Add handlers to logger
     logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     return logger
 
@@ -66,6 +141,27 @@ async def run_stdio_server(logger):
         )
 
 
+def sse_http_protocol():
+    """Build a uvicorn HTTP protocol class with no transport write high-water mark
+
+    With high=0 uvicorn pauses the response as soon as anything is left in
+    the transport buffer, so each SSE send only completes once the data has
+    been handed to the socket. Large tool results then stream with real
+    backpressure instead of accumulating in the write buffer.
+    """
+    try:
+        from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol as base
+    except ImportError:
+        from uvicorn.protocols.http.h11_impl import H11Protocol as base
+
+    class DrainedHTTPProtocol(base):
+        def connection_made(self, transport):
+            transport.set_write_buffer_limits(high=0)
+            super().connection_made(transport)
+
+    return DrainedHTTPProtocol
+
+
 async def run_sse_server(logger):
     """Run server in SSE mode (for Zeabur/Web deployment)"""
     logger.info("Starting Odoo MCP server with SSE transport...")
@@ -83,10 +179,42 @@ async def run_sse_server(logger):
     await mcp.run_sse_async(
         host=host,
         port=port,
-        log_level="info"
+        log_level="info",
+        uvicorn_config={"http": sse_http_protocol()}
     )
 
 
+def run_with_fast_loop(coro):
+    """Run a coroutine on uvloop when installed (uvicorn[standard]), else on asyncio"""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+
+    if hasattr(uvloop, "run"):
+        return uvloop.run(coro)
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(coro)
+
+
+def log_diagnostics(logger):
+    """Log package versions, runner methods and ODOO_*/MCP_* environment variables"""
+    logger.info(f"FastMCP version: {FASTMCP_VERSION}")
+    logger.info(f"FastMCP location: {fastmcp.__file__}")
+    logger.info(f"FastMCP available methods: {list(RUN_METHODS)}")
+    logger.info(f"MCP SDK version: {MCP_SDK_VERSION}")
+
+    logger.info("Environment variables:")
+    for key, value in os.environ.items():
+        if key.startswith(ENV_LOG_PREFIXES):
+            if "PASSWORD" in key:
+                logger.info(f"  {key}: ***hidden***")
+            else:
+                logger.info(f"  {key}: {value}")
+
+    logger.info(f"MCP object type: {type(mcp)}")
+
+
 def main() -> int:
     """Main entry point"""
     logger = setup_logging()
@@ -96,36 +224,14 @@ def main() -> int:
         logger.info(f"Python version: {sys.version}")
         logger.info(f"Transport mode: {TRANSPORT_MODE}")
 
-        # Log package versions
-        try:
-            import fastmcp
-            logger.info(f"FastMCP version: {fastmcp.__version__ if hasattr(fastmcp, '__version__') else 'unknown'}")
-            logger.info(f"FastMCP location: {fastmcp.__file__}")
-            logger.info(f"FastMCP available methods: {[m for m in dir(mcp) if m.startswith('run')]}")
-        except Exception as e:
-            logger.warning(f"Could not get FastMCP version: {e}")
-
-        try:
-            import mcp as mcp_sdk
-            logger.info(f"MCP SDK version: {mcp_sdk.__version__ if hasattr(mcp_sdk, '__version__') else 'unknown'}")
-        except Exception as e:
-            logger.warning(f"Could not get MCP SDK version: {e}")
-
-        logger.info("Environment variables:")
-        for key, value in os.environ.items():
-            if key.startswith("ODOO_") or key.startswith("MCP_"):
-                if "PASSWORD" in key:
-                    logger.info(f"  {key}: ***hidden***")
-                else:
-                    logger.info(f"  {key}: {value}")
-
-        logger.info(f"MCP object type: {type(mcp)}")
+        if logger.isEnabledFor(logging.DEBUG) or os.getenv("MCP_DIAGNOSTICS") == "1":
+            log_diagnostics(logger)
 
         # Run appropriate server
         if TRANSPORT_MODE == "stdio":
             asyncio.run(run_stdio_server(logger))
         elif TRANSPORT_MODE == "sse":
-            asyncio.run(run_sse_server(logger))
+            run_with_fast_loop(run_sse_server(logger))
 
         logger.info("MCP server stopped normally")
         return 0
@@ -2,12 +2,32 @@
 Unified Configuration Management for Odoo MCP Server
 Type-safe configuration with validation
 """
+import mmap
 import os
+from functools import lru_cache
 from typing import Optional
 from dataclasses import dataclass
 from pathlib import Path
 import json
 
+try:
+    import orjson
+except ImportError:  # optional speedup, fall back to stdlib json
+    orjson = None
+
+
+def _load_json(file_path: str) -> dict:
+    """Read and parse a JSON file, using orjson over a memory map when available"""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"Empty configuration file: {file_path}")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
 
 @dataclass
 class OdooConfig:
@@ -36,20 +56,20 @@ class OdooConfig:
     @classmethod
     def from_env(cls) -> "OdooConfig":
         """Load configuration from environment variables"""
+        env = os.environ
         return cls(
-            url=os.getenv("ODOO_URL", ""),
-            database=os.getenv("ODOO_DB", ""),
-            username=os.getenv("ODOO_USERNAME", ""),
-            password=os.getenv("ODOO_PASSWORD", ""),
-            timeout=int(os.getenv("ODOO_TIMEOUT", "60")),
-            verify_ssl=os.getenv("ODOO_VERIFY_SSL", "false").lower() == "true"
+            url=env.get("ODOO_URL", ""),
+            database=env.get("ODOO_DB", ""),
+            username=env.get("ODOO_USERNAME", ""),
+            password=env.get("ODOO_PASSWORD", ""),
+            timeout=int(env.get("ODOO_TIMEOUT", "60")),
+            verify_ssl=env.get("ODOO_VERIFY_SSL", "false").lower() == "true"
         )
 
     @classmethod
     def from_json(cls, file_path: str) -> "OdooConfig":
         """Load configuration from JSON file"""
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        data = _load_json(file_path)
         return cls(**data)
 
     def to_dict(self) -> dict:
@@ -74,11 +94,12 @@ class MCPConfig:
     @classmethod
     def from_env(cls) -> "MCPConfig":
         """Load configuration from environment variables"""
+        env = os.environ
         return cls(
-            transport=os.getenv("MCP_TRANSPORT", "stdio"),
-            host=os.getenv("HOST", "0.0.0.0"),
-            port=int(os.getenv("PORT", "8000")),
-            log_level=os.getenv("LOG_LEVEL", "INFO")
+            transport=env.get("MCP_TRANSPORT", "stdio"),
+            host=env.get("HOST", "0.0.0.0"),
+            port=int(env.get("PORT", "8000")),
+            log_level=env.get("LOG_LEVEL", "INFO")
         )
 
 
@@ -89,8 +110,9 @@ class UnifiedConfig:
     mcp: MCPConfig
 
     @classmethod
+    @lru_cache(maxsize=1)
     def from_env(cls) -> "UnifiedConfig":
-        """Load all configuration from environment variables"""
+        """Load all configuration from environment variables (cached, see reset_config)"""
         return cls(
             odoo=OdooConfig.from_env(),
             mcp=MCPConfig.from_env()
@@ -99,8 +121,7 @@ class UnifiedConfig:
     @classmethod
     def from_json(cls, file_path: str) -> "UnifiedConfig":
         """Load all configuration from JSON file"""
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        data = _load_json(file_path)
 
         return cls(
             odoo=OdooConfig(**data.get("odoo", {})),
@@ -145,3 +166,4 @@ def reset_config():
     """Reset global configuration (useful for testing)"""
     global _config
     _config = None
+    UnifiedConfig.from_env.cache_clear()
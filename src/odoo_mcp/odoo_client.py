@@ -3,14 +3,18 @@ Odoo XML-RPC client for MCP server integration
 """
 
 import json
+import logging
 import os
 import re
 import socket
+import threading
 import urllib.parse
 
 import http.client
 import xmlrpc.client
 
+logger = logging.getLogger(__name__)
+
 
 class OdooClient:
     """Client for interacting with Odoo via XML-RPC"""
@@ -55,6 +59,11 @@ class OdooClient:
         # Setup connections
         self._common = None
         self._models = None
+        # xmlrpc transports keep per-connection state and are not thread-safe,
+        # so each thread that issues RPCs gets its own object endpoint proxy
+        self._local = threading.local()
+        # Whether the server has web_save (Odoo 17+); None until the first try
+        self._web_save_supported = None
 
         # Parse hostname for logging
         parsed_url = urllib.parse.urlparse(self.url)
@@ -63,14 +72,28 @@ class OdooClient:
         # Connect
         self._connect()
 
-    def _connect(self):
-        """Initialize the XML-RPC connection and authenticate"""
-        # Tạo transport với timeout phù hợp
+    def _new_transport(self):
+        """Create a transport with the client's timeout and SSL settings"""
         is_https = self.url.startswith("https://")
-        transport = RedirectTransport(
+        return RedirectTransport(
             timeout=self.timeout, use_https=is_https, verify_ssl=self.verify_ssl
         )
 
+    def _object_proxy(self):
+        """Return the calling thread's proxy for the /xmlrpc/2/object endpoint"""
+        proxy = getattr(self._local, "models", None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(
+                f"{self.url}/xmlrpc/2/object", transport=self._new_transport()
+            )
+            self._local.models = proxy
+        return proxy
+
+    def _connect(self):
+        """Initialize the XML-RPC connection and authenticate"""
+        # Tạo transport với timeout phù hợp
+        transport = self._new_transport()
+
         print(f"Connecting to Odoo at: {self.url}", file=os.sys.stderr)
         print(f"  Hostname: {self.hostname}", file=os.sys.stderr)
         print(
@@ -85,6 +108,7 @@ class OdooClient:
         self._models = xmlrpc.client.ServerProxy(
             f"{self.url}/xmlrpc/2/object", transport=transport
         )
+        self._local.models = self._models
 
         # Xác thực và lấy user ID
         print(
@@ -110,7 +134,7 @@ class OdooClient:
 
     def _execute(self, model, method, *args, **kwargs):
         """Execute a method on an Odoo model"""
-        return self._models.execute_kw(
+        return self._object_proxy().execute_kw(
             self.db, self.uid, self.password, model, method, args, kwargs
         )
 
@@ -196,7 +220,7 @@ class OdooClient:
                 "ir.model",
                 "search_read",
                 [("model", "=", model_name)],
-                {"fields": ["name", "model"]},
+                fields=["name", "model"],
             )
 
             if not result:
@@ -264,12 +288,55 @@ class OdooClient:
             if order is not None:
                 kwargs["order"] = order
 
-            result = self._execute(model_name, "search_read", domain, kwargs)
+            result = self._execute(model_name, "search_read", domain, **kwargs)
             return result
         except Exception as e:
             print(f"Error in search_read: {str(e)}", file=os.sys.stderr)
             return []
 
+    def iter_search_read(
+        self, model_name, domain, fields=None, order=None, batch_size=1000
+    ):
+        """
+        Iterate over matching records, fetching them in pages
+
+        Each page is one search_read call with offset/limit. Iteration stops
+        at the first page shorter than batch_size, so a consumer that stops
+        early never requests the remaining pages. Unlike search_read, errors
+        are raised instead of returning an empty result.
+
+        Args:
+            model_name: Name of the model (e.g., 'res.partner')
+            domain: Search domain (e.g., [('is_company', '=', True)])
+            fields: List of field names to return (None for all)
+            order: Sorting criteria (e.g., 'name ASC, id DESC'); should be
+                deterministic (end with 'id') so pages do not overlap
+            batch_size: Number of records per call
+
+        Yields:
+            Dictionaries with the matching records
+
+        Examples:
+            >>> client = OdooClient(url, db, username, password)
+            >>> for partner in client.iter_search_read('res.partner', [], ['name'], order='id'):
+            ...     print(partner['name'])
+        """
+        kwargs = {"limit": batch_size}
+        if fields is not None:
+            kwargs["fields"] = fields
+        if order is not None:
+            kwargs["order"] = order
+
+        offset = 0
+        while True:
+            batch = self._execute(
+                model_name, "search_read", domain, offset=offset, **kwargs
+            )
+            yield from batch
+            if not batch or len(batch) < batch_size:
+                return
+            offset += batch_size
+
     def read_records(self, model_name, ids, fields=None):
         """
         Read data of records by IDs
@@ -293,12 +360,71 @@ class OdooClient:
             if fields is not None:
                 kwargs["fields"] = fields
 
-            result = self._execute(model_name, "read", ids, kwargs)
+            result = self._execute(model_name, "read", ids, **kwargs)
             return result
         except Exception as e:
             print(f"Error reading records: {str(e)}", file=os.sys.stderr)
             return []
 
+    def create_and_read(self, model_name, values, fields):
+        """
+        Create a record and return the requested fields of the new record
+
+        Uses web_save (Odoo 17+), which creates and reads back in a single
+        RPC. On servers without it, falls back to create followed by read,
+        and remembers not to try web_save again. Only a "method does not
+        exist" fault on the first call means web_save is missing; any other
+        fault is raised.
+
+        Args:
+            model_name: Name of the model (e.g., 'account.move')
+            values: Field values for the new record
+            fields: List of field names to return
+
+        Returns:
+            Dictionary with 'id' and the requested fields
+
+        Examples:
+            >>> client = OdooClient(url, db, username, password)
+            >>> move = client.create_and_read('account.move', vals, ['name', 'state'])
+            >>> print(move['state'])
+            'draft'
+        """
+        if self._web_save_supported is not False:
+            try:
+                records = self._execute(
+                    model_name,
+                    "web_save",
+                    [],
+                    values,
+                    specification={field: {} for field in fields},
+                )
+                self._web_save_supported = True
+                return records[0]
+            except xmlrpc.client.Fault as e:
+                if self._web_save_supported or not _is_missing_method(e, "web_save"):
+                    raise
+                self._web_save_supported = False
+
+        record_id = self._execute(model_name, "create", values)
+        return self._execute(model_name, "read", [record_id], fields)[0]
+
+
+def _is_missing_method(fault, method):
+    """
+    Tell whether an XML-RPC fault means the model has no such method
+
+    Odoo reports an unknown method as an AttributeError, either "The method
+    '<method>' does not exist on the model ..." or "... has no attribute
+    '<method>'". Any other fault (a business error, a failure inside the
+    method) does not count, even if its traceback mentions the method name.
+    """
+    text = fault.faultString
+    return (
+        f"method '{method}' does not exist" in text
+        or f"has no attribute '{method}'" in text
+    )
+
 
 class RedirectTransport(xmlrpc.client.Transport):
     """Transport that adds timeout, SSL verification, and redirect handling"""
@@ -319,6 +445,11 @@ class RedirectTransport(xmlrpc.client.Transport):
             self.context = ssl._create_unverified_context()
 
     def make_connection(self, host):
+        # Reuse the open connection (HTTP keep-alive) like the base Transport
+        # does; it closes and forgets the connection when a request fails
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+
         if self.proxy:
             proxy_url = urllib.parse.urlparse(self.proxy)
             connection = http.client.HTTPConnection(
@@ -336,6 +467,7 @@ class RedirectTransport(xmlrpc.client.Transport):
                 else:
                     connection = http.client.HTTPConnection(host, timeout=self.timeout)
 
+        self._connection = host, connection
         return connection
 
     def request(self, host, handler, request_body, verbose):
@@ -343,7 +475,7 @@ class RedirectTransport(xmlrpc.client.Transport):
         redirects = 0
         while redirects < self.max_redirects:
             try:
-                print(f"Making request to {host}{handler}", file=os.sys.stderr)
+                logger.debug("Making request to %s%s", host, handler)
                 return super().request(host, handler, request_body, verbose)
             except xmlrpc.client.ProtocolError as err:
                 if err.errcode in (301, 302, 303, 307, 308) and err.headers.get(
@@ -404,9 +536,36 @@ def load_config():
     )
 
 
+# Shared client returned by get_odoo_client, created on first use
+_client = None
+_client_lock = threading.Lock()
+
+
 def get_odoo_client():
     """
-    Get a configured Odoo client instance
+    Get the shared Odoo client instance
+
+    The client is created and authenticated once per process; every tool
+    module uses the same instance. It does not need to be recreated when a
+    call fails: a failed request closes its HTTP connection and the next
+    request opens a new one. If creating the client fails, nothing is kept
+    and the next call tries again.
+
+    Returns:
+        OdooClient: The shared, authenticated Odoo client
+    """
+    global _client
+    if _client is None:
+        # Lock so concurrent first calls (tools run in threads) log in once
+        with _client_lock:
+            if _client is None:
+                _client = _create_odoo_client()
+    return _client
+
+
+def _create_odoo_client():
+    """
+    Create a configured Odoo client instance
 
     Returns:
         OdooClient: A configured Odoo client instance
@@ -4,14 +4,39 @@ Provides comprehensive Odoo ERP integration with 17+ tools
 """
 
 import json
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass, fields as dataclass_fields
+from datetime import timedelta
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Union
 
 from fastmcp import FastMCP  # Use standalone fastmcp package, not mcp.server.fastmcp
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
-from .odoo_client import OdooClient, get_odoo_client
+from .odoo_client import get_odoo_client
 from .extensions import register_all_extensions
+from .utils import parse_date
+
+try:
+    import orjson
+except ImportError:  # optional speedup, FastMCP's default serializer is used instead
+    orjson = None
+
+
+def _orjson_default(obj: Any) -> Any:
+    """Fallback for values orjson cannot encode natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return str(obj)
+
+
+def _serialize_tool_result(data: Any) -> str:
+    """Serialize a tool result to JSON text with orjson
+
+    OPT_NON_STR_KEYS is needed because several tools return dicts keyed by
+    record ID (e.g. check_product_availability).
+    """
+    return orjson.dumps(
+        data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS
+    ).decode()
 
 
 # Create MCP server using latest FastMCP API
@@ -39,14 +64,12 @@ mcp = FastMCP(
     - Get detailed cost breakdown (RMB base cost, exchange rate, service fee, shipping, SI fee)
 
     Note: MCP Resources disabled for N8N to reduce token usage. Use execute_method for all queries.
-    """
+    """,
+    tool_serializer=_serialize_tool_result if orjson is not None else None,
 )
 
 
-# Helper function to get Odoo client (used by all tools)
-def _get_odoo() -> OdooClient:
-    """Get Odoo client instance"""
-    return get_odoo_client()
+_HOLIDAY_MODEL = "hr.leave.report.calendar"
 
 
 # ----- MCP Resources -----
@@ -87,9 +110,9 @@ class DomainCondition(BaseModel):
     )
     value: Any = Field(description="Value to compare against")
 
-    def to_tuple(self) -> List:
+    def to_tuple(self) -> Tuple[str, str, Any]:
         """Convert to Odoo domain condition tuple"""
-        return [self.field, self.operator, self.value]
+        return (self.field, self.operator, self.value)
 
 
 class SearchDomain(BaseModel):
@@ -100,16 +123,20 @@ class SearchDomain(BaseModel):
         description="List of conditions for searching. All conditions are combined with AND operator.",
     )
 
-    def to_domain_list(self) -> List[List]:
+    def to_domain_list(self) -> List[Tuple[str, str, Any]]:
         """Convert to Odoo domain list format"""
         return [condition.to_tuple() for condition in self.conditions]
 
 
-class EmployeeSearchResult(BaseModel):
+# Per-record result types are slotted dataclasses rather than BaseModels: no
+# per-instance __dict__/__pydantic_fields_set__, and pydantic still validates
+# and documents them through the Annotated field metadata.
+@dataclass(slots=True)
+class EmployeeSearchResult:
     """Represents a single employee search result."""
 
-    id: int = Field(description="Employee ID")
-    name: str = Field(description="Employee name")
+    id: Annotated[int, Field(description="Employee ID")]
+    name: Annotated[str, Field(description="Employee name")]
 
 
 class SearchEmployeeResponse(BaseModel):
@@ -122,17 +149,21 @@ class SearchEmployeeResponse(BaseModel):
     error: Optional[str] = Field(default=None, description="Error message, if any")
 
 
-class Holiday(BaseModel):
+@dataclass(slots=True)
+class Holiday:
     """Represents a single holiday."""
 
-    display_name: str = Field(description="Display name of the holiday")
-    start_datetime: str = Field(description="Start date and time of the holiday")
-    stop_datetime: str = Field(description="End date and time of the holiday")
-    employee_id: List[Union[int, str]] = Field(
-        description="Employee ID associated with the holiday"
-    )
-    name: str = Field(description="Name of the holiday")
-    state: str = Field(description="State of the holiday")
+    display_name: Annotated[str, Field(description="Display name of the holiday")]
+    start_datetime: Annotated[
+        str, Field(description="Start date and time of the holiday")
+    ]
+    stop_datetime: Annotated[str, Field(description="End date and time of the holiday")]
+    employee_id: Annotated[
+        List[Union[int, str]],
+        Field(description="Employee ID associated with the holiday"),
+    ]
+    name: Annotated[str, Field(description="Name of the holiday")]
+    state: Annotated[str, Field(description="State of the holiday")]
 
 
 class SearchHolidaysResponse(BaseModel):
@@ -145,6 +176,14 @@ class SearchHolidaysResponse(BaseModel):
     error: Optional[str] = Field(default=None, description="Error message, if any")
 
 
+# Batch validators: one pydantic-core call per result list instead of one
+# model __init__ per record
+_HOLIDAY_LIST_ADAPTER = TypeAdapter(List[Holiday])
+
+# Only read the columns Holiday exposes instead of every field on the model
+_HOLIDAY_FIELDS = [f.name for f in dataclass_fields(Holiday)]
+
+
 # ----- MCP Tools -----
 
 
@@ -178,7 +217,8 @@ def execute_method(
 
     WARNING: Not setting 'limit' or 'fields' can cause extremely large responses (2M+ tokens)!
     """
-    odoo = _get_odoo()
+    odoo = get_odoo_client()
+
     try:
         # Execute method with kwargs only (no positional args)
         result = odoo.execute_method(model, method, **kwargs)
@@ -202,7 +242,7 @@ def search_employee(
     Returns:
         SearchEmployeeResponse containing results or error information.
     """
-    odoo = _get_odoo()
+    odoo = get_odoo_client()
     model = "hr.employee"
     method = "name_search"
 
@@ -211,8 +251,10 @@ def search_employee(
 
     try:
         result = odoo.execute_method(model, method, *args, **kwargs)
+        # name_search always returns (id, display name) pairs, so skip validation
         parsed_result = [
-            EmployeeSearchResult(id=item[0], name=item[1]) for item in result
+            EmployeeSearchResult(id=item[0], name=item[1])
+            for item in result
         ]
         return SearchEmployeeResponse(success=True, result=parsed_result)
     except Exception as e:
@@ -236,45 +278,42 @@ def search_holidays(
     Returns:
         SearchHolidaysResponse:  Object containing the search results.
     """
-    odoo = _get_odoo()
+    odoo = get_odoo_client()
 
-    # Validate date format using datetime
+    # Validate date format (start_date is parsed once and reused)
     try:
-        datetime.strptime(start_date, "%Y-%m-%d")
+        start_date_dt = parse_date(start_date)
     except ValueError:
         return SearchHolidaysResponse(
             success=False, error="Invalid start_date format. Use YYYY-MM-DD."
         )
     try:
-        datetime.strptime(end_date, "%Y-%m-%d")
+        parse_date(end_date)
     except ValueError:
         return SearchHolidaysResponse(
             success=False, error="Invalid end_date format. Use YYYY-MM-DD."
         )
 
     # Calculate adjusted start_date (subtract one day)
-    start_date_dt = datetime.strptime(start_date, "%Y-%m-%d")
-    adjusted_start_date_dt = start_date_dt - timedelta(days=1)
-    adjusted_start_date = adjusted_start_date_dt.strftime("%Y-%m-%d")
+    adjusted_start_date = (start_date_dt - timedelta(days=1)).strftime("%Y-%m-%d")
 
     # Build the domain
     domain = [
         "&",
-        ["start_datetime", "<=", f"{end_date} 22:59:59"],
+        ("start_datetime", "<=", f"{end_date} 22:59:59"),
         # Use adjusted date
-        ["stop_datetime", ">=", f"{adjusted_start_date} 23:00:00"],
+        ("stop_datetime", ">=", f"{adjusted_start_date} 23:00:00"),
     ]
     if employee_id:
-        domain.append(
-            ["employee_id", "=", employee_id],
-        )
+        domain.append(("employee_id", "=", employee_id))
 
     try:
         holidays = odoo.search_read(
-            model_name="hr.leave.report.calendar",
+            model_name=_HOLIDAY_MODEL,
             domain=domain,
+            fields=_HOLIDAY_FIELDS,
         )
-        parsed_holidays = [Holiday(**holiday) for holiday in holidays]
+        parsed_holidays = _HOLIDAY_LIST_ADAPTER.validate_python(holidays)
         return SearchHolidaysResponse(success=True, result=parsed_holidays)
 
     except Exception as e:
@@ -2,8 +2,11 @@
 Implementación de herramientas (tools) para contabilidad en MCP-Odoo
 """
 
-from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import timedelta
 from fastmcp import FastMCP
 
 from .models import (
@@ -12,22 +15,140 @@ from .models import (
     FinancialRatioInput
 )
 from .odoo_client import get_odoo_client
+from .utils import cache_response, cached_response, parse_date
+
+# Pool para las lecturas anticipadas (prefetch_next), que sobreviven a la
+# llamada que las lanza (OdooClient usa un proxy XML-RPC por hilo, así que es
+# seguro llamarlo desde aquí)
+_rpc_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="odoo-accounting")
+
+# Campos leídos por search_journal_entries (el marshaller XML-RPC envía las
+# tuplas como arrays, así que no hace falta copiarlas a listas en cada llamada)
+_ENTRY_FIELDS = (
+    "name", "ref", "date", "journal_id", "state",
+    "amount_total", "amount_total_signed", "line_ids"
+)
+_LINE_FIELDS = ("move_id", "name", "account_id", "partner_id", "debit", "credit", "balance")
+
+# Fragmentos fijos del read_group de analyze_financial_ratios
+_POSTED = ("parent_state", "=", "posted")
+_BALANCE_SUM = ("balance:sum",)
+_RATIO_GROUPBY = ("account_internal_group", "account_internal_type")
+
+# Caché de analyze_financial_ratios: (date_from, date_to, ratios) -> (expira, respuesta).
+# Solo un minuto, incluso para períodos pasados: los asientos con fecha
+# retroactiva y las reversiones también cambian un período ya cerrado
+_ratio_cache: Dict[tuple, tuple] = {}
+_RATIO_CACHE_TTL = 60
+_RATIO_CACHE_MAX_SIZE = 256
+
+# Grupos internos de cuentas que necesita cada ratio
+_RATIO_GROUPS = {
+    "liquidity": ("asset", "liability"),
+    "profitability": ("asset", "equity", "income", "expense"),
+    "debt": ("asset", "liability", "equity"),
+    "efficiency": ("asset", "income"),
+}
+
+# Páginas de search_journal_entries pedidas por adelantado con prefetch_next:
+# (dominio, limit, offset) -> (creada, Future). Se descartan pasados 30 segundos
+_page_cache: Dict[tuple, tuple] = {}
+_PAGE_CACHE_TTL = 30
+_PAGE_CACHE_MAX_SIZE = 32
+
+def _validate_create(
+    journal_id: int,
+    lines: List[Dict[str, Any]],
+    ref: Optional[str],
+    entry_date: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Valida los datos de create_journal_entry y prepara los valores del asiento
+
+    Las líneas se validan, totalizan y convierten en comandos (0, 0, vals) en
+    una sola pasada.
+
+    Returns:
+        (error, None) si los datos no son válidos, o (None, move_vals)
+    """
+    if not lines:
+        return {"success": False, "error": "Debe proporcionar al menos una línea"}, None
+
+    move_vals = {
+        "journal_id": journal_id,
+        "line_ids": []
+    }
+
+    if ref:
+        move_vals["ref"] = ref
+
+    if entry_date:
+        try:
+            parse_date(entry_date)
+        except ValueError:
+            return {"success": False, "error": f"Formato de fecha inválido: {entry_date}. Use YYYY-MM-DD."}, None
+        move_vals["date"] = entry_date
+
+    # Totales en céntimos enteros: la comparación es exacta, sin deriva de coma flotante
+    total_debit_cents = 0
+    total_credit_cents = 0
+    for line in lines:
+        if not isinstance(line, dict):
+            return {"success": False, "error": "Cada línea debe ser un diccionario"}, None
+
+        if "account_id" not in line:
+            return {"success": False, "error": "Cada línea debe contener account_id"}, None
+
+        debit = line.get("debit", 0.0)
+        credit = line.get("credit", 0.0)
+        if not isinstance(debit, (int, float)) or not isinstance(credit, (int, float)):
+            return {"success": False, "error": "El debe y el haber de cada línea deben ser numéricos"}, None
+        total_debit_cents += int(round(debit * 100))
+        total_credit_cents += int(round(credit * 100))
+
+        line_vals = {
+            "account_id": line["account_id"],
+            "name": line.get("name") or "/",
+            "debit": debit,
+            "credit": credit
+        }
+
+        if line.get("partner_id"):
+            line_vals["partner_id"] = line["partner_id"]
+
+        # Comando ORM (0, 0, vals): crear la línea junto con el asiento
+        move_vals["line_ids"].append((0, 0, line_vals))
+
+    # Verificar que el debe y el haber cuadran
+    if total_debit_cents != total_credit_cents:
+        return {
+            "success": False,
+            "error": f"El asiento no está cuadrado. Debe: {total_debit_cents / 100}, Haber: {total_credit_cents / 100}"
+        }, None
+
+    return None, move_vals
+
+
+def _cache_ratio_response(cache_key: tuple, now: float, response: Dict[str, Any]) -> None:
+    """Guarda una respuesta de analyze_financial_ratios durante _RATIO_CACHE_TTL segundos"""
+    cache_response(_ratio_cache, cache_key, now, _RATIO_CACHE_TTL, response, _RATIO_CACHE_MAX_SIZE)
 
 def register_accounting_tools(mcp: FastMCP) -> None:
     """Registra herramientas relacionadas con contabilidad"""
 
-    # Helper function to get Odoo client
-    def _get_odoo():
-        return get_odoo_client()
+    # Las herramientas son async y ejecutan las llamadas XML-RPC (bloqueantes)
+    # en hilos con asyncio.to_thread, para no detener el bucle de eventos del
+    # servidor MCP mientras esperan a Odoo
 
     @mcp.tool(description="Busca asientos contables con filtros")
-    def search_journal_entries(
+    async def search_journal_entries(
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
         journal_id: Optional[int] = None,
         state: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        prefetch_next: bool = False
     ) -> Dict[str, Any]:
         """
         Busca asientos contables según los filtros especificados
@@ -39,11 +160,13 @@ def register_accounting_tools(mcp: FastMCP) -> None:
             state: Estado del asiento, ej: 'posted', 'draft' (opcional)
             limit: Límite de resultados (default: 20)
             offset: Offset para paginación (default: 0)
+            prefetch_next: Pedir en segundo plano la página siguiente para que
+                la próxima llamada con offset + limit la obtenga sin esperar (default: False)
 
         Returns:
             Diccionario con resultados de la búsqueda
         """
-        odoo = _get_odoo()
+        odoo = await asyncio.to_thread(get_odoo_client)
 
         try:
             # Construir dominio de búsqueda
@@ -51,14 +174,14 @@ def register_accounting_tools(mcp: FastMCP) -> None:
 
             if date_from:
                 try:
-                    datetime.strptime(date_from, "%Y-%m-%d")
+                    parse_date(date_from)
                     domain.append(("date", ">=", date_from))
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_from}. Use YYYY-MM-DD."}
 
             if date_to:
                 try:
-                    datetime.strptime(date_to, "%Y-%m-%d")
+                    parse_date(date_to)
                     domain.append(("date", "<=", date_to))
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_to}. Use YYYY-MM-DD."}
@@ -69,36 +192,74 @@ def register_accounting_tools(mcp: FastMCP) -> None:
             if state:
                 domain.append(("state", "=", state))
 
-            # Campos a recuperar
-            fields = [
-                "name", "ref", "date", "journal_id", "state",
-                "amount_total", "amount_total_signed", "line_ids"
-            ]
-
-            # Ejecutar búsqueda
-            entries = odoo.search_read(
-                "account.move",
-                domain,
-                fields=fields,
-                limit=limit,
-                offset=offset
+            # Ejecutar búsqueda y conteo total (sin límite, para paginación)
+            # en paralelo: son consultas independientes sobre el mismo dominio
+            page_key = (tuple(domain), limit, offset)
+            prefetched = _page_cache.pop(page_key, None)
+            if prefetched is not None and time.monotonic() - prefetched[0] < _PAGE_CACHE_TTL:
+                page = asyncio.wrap_future(prefetched[1])
+            else:
+                page = asyncio.to_thread(
+                    odoo.search_read,
+                    "account.move",
+                    domain,
+                    fields=_ENTRY_FIELDS,
+                    limit=limit,
+                    offset=offset
+                )
+
+            # Lanzar la lectura de la página siguiente mientras se procesa esta
+            if prefetch_next:
+                if len(_page_cache) >= _PAGE_CACHE_MAX_SIZE:
+                    _page_cache.pop(next(iter(_page_cache)))
+                _page_cache[(tuple(domain), limit, offset + limit)] = (
+                    time.monotonic(),
+                    _rpc_executor.submit(
+                        odoo.search_read,
+                        "account.move",
+                        domain,
+                        fields=_ENTRY_FIELDS,
+                        limit=limit,
+                        offset=offset + limit
+                    )
+                )
+
+            entries, total_count = await asyncio.gather(
+                page,
+                asyncio.to_thread(odoo.execute_method, "account.move", "search_count", domain)
             )
+
+            # Sin asientos no hay líneas que pedir ni repartir
+            if not entries:
+                return {
+                    "success": True,
+                    "result": {
+                        "count": 0,
+                        "total_count": total_count,
+                        "entries": []
+                    }
+                }
             
-            # Obtener el conteo total sin límite para paginación
-            total_count = odoo.execute_method("account.move", "search_count", domain)
-            
-            # Para cada asiento, obtener información resumida de las líneas
-            for entry in entries:
-                if entry.get("line_ids"):
-                    line_ids = entry["line_ids"]
-                    lines = odoo.search_read(
-                        "account.move.line",
-                        [("id", "in", line_ids)],
-                        fields=["name", "account_id", "partner_id", "debit", "credit", "balance"]
-                    )
-                    entry["lines"] = lines
-                    # Eliminar la lista de IDs para reducir tamaño
-                    entry.pop("line_ids", None)
+            # Obtener las líneas de todos los asientos en una sola llamada
+            # (en lugar de un search_read por asiento) y repartirlas por move_id.
+            # Las listas de IDs se separan una sola vez del resultado para reducir tamaño
+            line_id_lists = [entry.pop("line_ids", None) or [] for entry in entries]
+            all_line_ids = [line_id for line_ids in line_id_lists for line_id in line_ids]
+            buckets = {}
+            if all_line_ids:
+                lines = await asyncio.to_thread(
+                    odoo.search_read,
+                    "account.move.line",
+                    [("id", "in", all_line_ids)],
+                    fields=_LINE_FIELDS
+                )
+                for line in lines:
+                    move = line.pop("move_id")
+                    buckets.setdefault(move[0] if move else False, []).append(line)
+
+            for entry, line_ids in zip(entries, line_id_lists):
+                if line_ids:
+                    entry["lines"] = buckets.get(entry["id"], [])
             
             return {
                 "success": True, 
@@ -113,7 +274,7 @@ def register_accounting_tools(mcp: FastMCP) -> None:
             return {"success": False, "error": str(e)}
     
     @mcp.tool(description="Crea un nuevo asiento contable")
-    def create_journal_entry(
+    async def create_journal_entry(
         journal_id: int,
         lines: List[Dict[str, Any]],
         ref: Optional[str] = None,
@@ -136,66 +297,20 @@ def register_accounting_tools(mcp: FastMCP) -> None:
         Returns:
             Respuesta con el resultado de la operación
         """
-        odoo = _get_odoo()
-
-        try:
-            # Validar líneas
-            if not lines:
-                return {"success": False, "error": "Debe proporcionar al menos una línea"}
+        # Los errores de validación previsibles se devuelven sin excepciones
+        # y sin llegar a conectar con Odoo
+        error, move_vals = _validate_create(journal_id, lines, ref, date)
+        if error:
+            return error
 
-            # Verificar que el debe y el haber cuadran
-            total_debit = sum(line.get("debit", 0.0) for line in lines)
-            total_credit = sum(line.get("credit", 0.0) for line in lines)
-
-            if round(total_debit, 2) != round(total_credit, 2):
-                return {
-                    "success": False,
-                    "error": f"El asiento no está cuadrado. Debe: {total_debit}, Haber: {total_credit}"
-                }
+        odoo = await asyncio.to_thread(get_odoo_client)
 
-            # Preparar valores para el asiento
-            move_vals = {
-                "journal_id": journal_id,
-                "line_ids": []
-            }
-
-            if ref:
-                move_vals["ref"] = ref
-
-            if date:
-                try:
-                    datetime.strptime(date, "%Y-%m-%d")
-                    move_vals["date"] = date
-                except ValueError:
-                    return {"success": False, "error": f"Formato de fecha inválido: {date}. Use YYYY-MM-DD."}
-
-            # Preparar líneas del asiento
-            for line in lines:
-                if not isinstance(line, dict):
-                    return {"success": False, "error": "Cada línea debe ser un diccionario"}
-
-                if "account_id" not in line:
-                    return {"success": False, "error": "Cada línea debe contener account_id"}
-
-                line_vals = [
-                    0, 0, {
-                        "account_id": line["account_id"],
-                        "name": line.get("name") or "/",
-                        "debit": line.get("debit", 0.0),
-                        "credit": line.get("credit", 0.0)
-                    }
-                ]
-
-                if "partner_id" in line and line["partner_id"]:
-                    line_vals[2]["partner_id"] = line["partner_id"]
-
-                move_vals["line_ids"].append(line_vals)
-            
-            # Crear asiento
-            move_id = odoo.execute_method("account.move", "create", move_vals)
-            
-            # Obtener información del asiento creado
-            move_info = odoo.execute_method("account.move", "read", [move_id], ["name", "state"])[0]
+        try:
+            # Crear asiento y obtener su nombre y estado (una sola llamada si el servidor lo permite)
+            move_info = await asyncio.to_thread(
+                odoo.create_and_read, "account.move", move_vals, ["name", "state"]
+            )
+            move_id = move_info["id"]
             
             return {
                 "success": True,
@@ -210,7 +325,7 @@ def register_accounting_tools(mcp: FastMCP) -> None:
             return {"success": False, "error": str(e)}
     
     @mcp.tool(description="Calcula ratios financieros clave")
-    def analyze_financial_ratios(
+    async def analyze_financial_ratios(
         date_from: str,
         date_to: str,
         ratios: List[str]
@@ -230,136 +345,79 @@ def register_accounting_tools(mcp: FastMCP) -> None:
         Returns:
             Diccionario con los ratios calculados
         """
-        odoo = _get_odoo()
+        odoo = await asyncio.to_thread(get_odoo_client)
 
         try:
             # Validar fechas
             try:
-                datetime.strptime(date_from, "%Y-%m-%d")
-                datetime.strptime(date_to, "%Y-%m-%d")
+                parse_date(date_from)
+                parse_date(date_to)
             except ValueError:
                 return {"success": False, "error": "Formato de fecha inválido. Use YYYY-MM-DD."}
 
+            # Devolver una copia del resultado en caché si sigue vigente
+            cache_key = (date_from, date_to, tuple(sorted(set(ratios))))
+            now = time.monotonic()
+            cached = cached_response(_ratio_cache, cache_key, now)
+            if cached is not None:
+                return cached
+
             # Verificar qué ratios se solicitan
             requested_ratios = ratios
 
             # Inicializar resultado
             ratios_result = {}
 
-            # Obtener datos del balance general
+            # Consultar solo los grupos de cuentas que usan los ratios pedidos;
+            # si ninguno los necesita no se hace ninguna llamada
+            needed_groups = sorted({
+                group for ratio in requested_ratios for group in _RATIO_GROUPS.get(ratio, ())
+            })
+
+            # Obtener datos del balance general con un único read_group:
+            # Odoo suma los saldos en SQL agrupando por grupo interno y tipo
+            # de cuenta (campos related almacenados en account.move.line),
+            # en lugar de devolver cada línea para sumarla en Python
+            groups = []
+            if needed_groups:
+                groups = await asyncio.to_thread(
+                    odoo.execute_method,
+                    "account.move.line",
+                    "read_group",
+                    [
+                        ("account_internal_group", "in", needed_groups),
+                        ("date", ">=", date_from),
+                        ("date", "<=", date_to),
+                        _POSTED
+                    ],
+                    _BALANCE_SUM,
+                    _RATIO_GROUPBY,
+                    lazy=False
+                )
+
+            balances = {
+                (group["account_internal_group"], group["account_internal_type"]): group["balance"] or 0.0
+                for group in groups
+            }
+
+            def _group_total(internal_group):
+                # Los grupos que no se consultaron suman 0.0, como un grupo sin saldo
+                return sum((v for (g, _t), v in balances.items() if g == internal_group), 0.0)
+
             # Activos
-            assets_domain = [
-                ("account_id.user_type_id.internal_group", "=", "asset"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            assets_data = odoo.search_read(
-                "account.move.line",
-                assets_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            total_assets = sum(line["balance"] for line in assets_data)
-            
+            total_assets = _group_total("asset")
             # Activos corrientes
-            current_assets_domain = [
-                ("account_id.user_type_id.internal_group", "=", "asset"),
-                ("account_id.user_type_id.type", "=", "liquidity"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            current_assets_data = odoo.search_read(
-                "account.move.line",
-                current_assets_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            current_assets = sum(line["balance"] for line in current_assets_data)
-            
+            current_assets = balances.get(("asset", "liquidity"), 0.0)
             # Pasivos
-            liabilities_domain = [
-                ("account_id.user_type_id.internal_group", "=", "liability"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            liabilities_data = odoo.search_read(
-                "account.move.line",
-                liabilities_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            total_liabilities = sum(line["balance"] for line in liabilities_data)
-            
+            total_liabilities = _group_total("liability")
             # Pasivos corrientes
-            current_liabilities_domain = [
-                ("account_id.user_type_id.internal_group", "=", "liability"),
-                ("account_id.user_type_id.type", "=", "payable"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            current_liabilities_data = odoo.search_read(
-                "account.move.line",
-                current_liabilities_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            current_liabilities = sum(line["balance"] for line in current_liabilities_data)
-            
+            current_liabilities = balances.get(("liability", "payable"), 0.0)
             # Patrimonio
-            equity_domain = [
-                ("account_id.user_type_id.internal_group", "=", "equity"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            equity_data = odoo.search_read(
-                "account.move.line",
-                equity_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            total_equity = sum(line["balance"] for line in equity_data)
-            
+            total_equity = _group_total("equity")
             # Ingresos
-            income_domain = [
-                ("account_id.user_type_id.internal_group", "=", "income"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            income_data = odoo.search_read(
-                "account.move.line",
-                income_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            total_income = sum(line["balance"] for line in income_data)
-            
+            total_income = _group_total("income")
             # Gastos
-            expense_domain = [
-                ("account_id.user_type_id.internal_group", "=", "expense"),
-                ("date", ">=", date_from),
-                ("date", "<=", date_to),
-                ("parent_state", "=", "posted")
-            ]
-            
-            expense_data = odoo.search_read(
-                "account.move.line",
-                expense_domain,
-                fields=["account_id", "balance"]
-            )
-            
-            total_expenses = sum(line["balance"] for line in expense_data)
+            total_expenses = _group_total("expense")
             
             # Calcular beneficio neto
             net_income = total_income - total_expenses
@@ -446,7 +504,9 @@ def register_accounting_tools(mcp: FastMCP) -> None:
                 "ratios": ratios_result
             }
             
-            return {"success": True, "result": result}
+            response = {"success": True, "result": result}
+            _cache_ratio_response(cache_key, now, response)
+            return response
             
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -2,8 +2,12 @@
 Implementación de herramientas (tools) para inventario en MCP-Odoo
 """
 
-from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Union
+from datetime import timedelta
 from fastmcp import FastMCP
 
 from .models import (
@@ -12,13 +16,73 @@ from .models import (
     InventoryTurnoverInput
 )
 from .odoo_client import get_odoo_client
+from .utils import parse_date
+
+# Pool para lanzar en paralelo lecturas independientes (OdooClient usa un
+# proxy XML-RPC por hilo, así que es seguro llamarlo desde aquí)
+_rpc_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="odoo-inventory")
+
+# Si existe el modelo stock.inventory (Odoo 13/14); la versión del servidor no
+# cambia mientras el proceso está vivo, así que se consulta una sola vez
+_INVENTORY_MODEL_CACHE: Optional[bool] = None
+
+# Claves obligatorias de cada línea de create_inventory_adjustment
+_REQUIRED_LINE_KEYS = frozenset({"product_id", "location_id", "product_qty"})
+
+
+@dataclass(slots=True)
+class ProductTurnover:
+    """Rotación calculada de un producto (un registro compacto por producto analizado)"""
+    id: int
+    name: str
+    default_code: Union[str, bool]
+    # Valor many2one tal cual ([id, nombre] o False); el texto de la categoría
+    # solo se construye para las filas que se devuelven
+    categ_id: Union[List[Any], bool]
+    cogs: float
+    avg_inventory_value: Optional[float]
+    turnover_ratio: float
+    days_inventory: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convierte el registro al formato devuelto por la herramienta"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "default_code": self.default_code,
+            "category": self.categ_id[1] if self.categ_id else "Sin categoría",
+            "cogs": self.cogs,
+            "avg_inventory_value": self.avg_inventory_value,
+            "turnover_ratio": self.turnover_ratio,
+            "days_inventory": self.days_inventory
+        }
+
+
+def _has_stock_inventory(odoo) -> bool:
+    """Indica si el servidor usa stock.inventory para los ajustes de inventario"""
+    global _INVENTORY_MODEL_CACHE
+    if _INVENTORY_MODEL_CACHE is None:
+        _INVENTORY_MODEL_CACHE = odoo.execute_method(
+            "ir.model",
+            "search_count",
+            [("model", "=", "stock.inventory")]
+        ) > 0
+    return _INVENTORY_MODEL_CACHE
 
 def register_inventory_tools(mcp: FastMCP) -> None:
     """Registra herramientas relacionadas con inventario"""
 
-    # Helper function to get Odoo client
-    def _get_odoo():
-        return get_odoo_client()
+    # Los nombres de ubicación apenas cambian: se guardan en una LRU por ID.
+    # Los errores de la llamada no se guardan (lru_cache no memoriza excepciones)
+    @lru_cache(maxsize=256)
+    def _resolve_location(location_id: int) -> Optional[Dict[str, Any]]:
+        location_data = get_odoo_client().execute_method(
+            "stock.location",
+            "search_read",
+            [("id", "=", location_id)],
+            fields=["name", "complete_name"]
+        )
+        return location_data[0] if location_data else None
 
     @mcp.tool(description="Verifica la disponibilidad de stock para uno o más productos")
     def check_product_availability(
@@ -35,72 +99,56 @@ def register_inventory_tools(mcp: FastMCP) -> None:
         Returns:
             Diccionario con información de disponibilidad
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
-            # Verificar que los productos existen
-            products = odoo.search_read(
+            # Construir contexto para la consulta
+            context = {}
+            if location_id:
+                context["location"] = location_id
+
+            # Verificar que los productos existen y obtener sus cantidades en
+            # una sola llamada: search_read solo devuelve los IDs que existen
+            products = odoo.execute_method(
                 "product.product",
+                "search_read",
                 [("id", "in", product_ids)],
-                fields=["name", "default_code", "type", "uom_id"]
+                fields=[
+                    "name", "default_code", "type", "uom_id",
+                    "qty_available", "virtual_available", "incoming_qty", "outgoing_qty"
+                ],
+                context=context
             )
 
             if not products:
                 return {"success": False, "error": "No se encontraron productos con los IDs proporcionados"}
 
-            # Mapear IDs a nombres para referencia
-            product_names = {p["id"]: p["name"] for p in products}
+            stock_by_id = {p["id"]: p for p in products}
 
             # Obtener disponibilidad
             availability = {}
 
             for product_id in product_ids:
-                # Construir contexto para la consulta
-                context = {}
-                if location_id:
-                    context["location"] = location_id
-                
-                # Obtener cantidad disponible usando el método qty_available
-                try:
-                    product_data = odoo.execute_method(
-                        "product.product", 
-                        "read", 
-                        [product_id], 
-                        ["qty_available", "virtual_available", "incoming_qty", "outgoing_qty"],
-                        context
-                    )
-                    
-                    if product_data:
-                        product_info = product_data[0]
-                        availability[product_id] = {
-                            "name": product_names.get(product_id, f"Producto {product_id}"),
-                            "qty_available": product_info["qty_available"],
-                            "virtual_available": product_info["virtual_available"],
-                            "incoming_qty": product_info["incoming_qty"],
-                            "outgoing_qty": product_info["outgoing_qty"]
-                        }
-                    else:
-                        availability[product_id] = {
-                            "name": product_names.get(product_id, f"Producto {product_id}"),
-                            "error": "Producto no encontrado"
-                        }
-                except Exception as e:
+                product_info = stock_by_id.get(product_id)
+                if product_info:
+                    availability[product_id] = {
+                        "name": product_info["name"],
+                        "qty_available": product_info["qty_available"],
+                        "virtual_available": product_info["virtual_available"],
+                        "incoming_qty": product_info["incoming_qty"],
+                        "outgoing_qty": product_info["outgoing_qty"]
+                    }
+                else:
                     availability[product_id] = {
-                        "name": product_names.get(product_id, f"Producto {product_id}"),
-                        "error": str(e)
+                        "name": f"Producto {product_id}",
+                        "error": "Producto no encontrado"
                     }
             
             # Obtener información de la ubicación si se especificó
             location_info = None
             if location_id:
                 try:
-                    location_data = odoo.search_read(
-                        "stock.location",
-                        [("id", "=", location_id)],
-                        fields=["name", "complete_name"]
-                    )
-                    if location_data:
-                        location_info = location_data[0]
+                    location_info = _resolve_location(location_id)
                 except Exception:
                     location_info = {"id": location_id, "name": "Ubicación desconocida"}
             
@@ -135,19 +183,24 @@ def register_inventory_tools(mcp: FastMCP) -> None:
         Returns:
             Respuesta con el resultado de la operación
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
+            # Validar todas las líneas antes de hacer cualquier llamada, para no
+            # dejar inventarios a medio crear si una línea es incorrecta
+            for line in adjustment_lines:
+                if not isinstance(line, dict):
+                    return {"success": False, "error": "Cada línea debe ser un diccionario"}
+
+                if not _REQUIRED_LINE_KEYS.issubset(line):
+                    return {"success": False, "error": "Cada línea debe contener product_id, location_id y product_qty"}
+
             # Verificar la versión de Odoo para determinar el modelo correcto
             # En Odoo 13.0+, se usa 'stock.inventory'
             # En Odoo 15.0+, se usa 'stock.quant' directamente
 
-            # Intentar obtener el modelo stock.inventory
-            inventory_model_exists = odoo.execute_method(
-                "ir.model",
-                "search_count",
-                [("model", "=", "stock.inventory")]
-            ) > 0
+            # Comprobar (una vez por proceso) si existe el modelo stock.inventory
+            inventory_model_exists = _has_stock_inventory(odoo)
 
             if inventory_model_exists:
                 # Usar el flujo de stock.inventory (Odoo 13.0, 14.0)
@@ -159,7 +212,7 @@ def register_inventory_tools(mcp: FastMCP) -> None:
 
                 if date:
                     try:
-                        datetime.strptime(date, "%Y-%m-%d")
+                        parse_date(date)
                         inventory_vals["date"] = date
                     except ValueError:
                         return {"success": False, "error": f"Formato de fecha inválido: {date}. Use YYYY-MM-DD."}
@@ -167,22 +220,18 @@ def register_inventory_tools(mcp: FastMCP) -> None:
                 # Crear el inventario
                 inventory_id = odoo.execute_method("stock.inventory", "create", inventory_vals)
 
-                # Añadir líneas al inventario
-                for line in adjustment_lines:
-                    if not isinstance(line, dict):
-                        return {"success": False, "error": "Cada línea debe ser un diccionario"}
-
-                    if "product_id" not in line or "location_id" not in line or "product_qty" not in line:
-                        return {"success": False, "error": "Cada línea debe contener product_id, location_id y product_qty"}
-
-                    line_vals = {
+                # Añadir todas las líneas al inventario con un único create múltiple
+                lines_vals = [
+                    {
                         "inventory_id": inventory_id,
                         "product_id": line["product_id"],
                         "location_id": line["location_id"],
                         "product_qty": line["product_qty"]
                     }
-
-                    odoo.execute_method("stock.inventory.line", "create", line_vals)
+                    for line in adjustment_lines
+                ]
+                if lines_vals:
+                    odoo.execute_method("stock.inventory.line", "create", lines_vals)
                 
                 # Confirmar el inventario
                 odoo.execute_method("stock.inventory", "action_validate", [inventory_id])
@@ -196,45 +245,61 @@ def register_inventory_tools(mcp: FastMCP) -> None:
                 }
             else:
                 # Usar el flujo de stock.quant (Odoo 15.0+)
-                result_ids = []
-
+                # Buscar de una vez los quants existentes de todas las líneas
+                # e indexarlos por (producto, ubicación). Con execute_method un
+                # error llega al except: si se tragara, no se encontraría ningún
+                # quant y se crearían quants duplicados para todas las líneas
+                existing_quants = odoo.execute_method(
+                    "stock.quant",
+                    "search_read",
+                    [
+                        ("product_id", "in", list({line["product_id"] for line in adjustment_lines})),
+                        ("location_id", "in", list({line["location_id"] for line in adjustment_lines}))
+                    ],
+                    fields=["id", "product_id", "location_id"],
+                    order="id"
+                )
+                # Si un par (producto, ubicación) tiene varios quants (lotes,
+                # paquetes o propietarios distintos) se ajusta el más antiguo,
+                # el de menor ID
+                quant_by_key = {}
+                for quant in existing_quants:
+                    quant_by_key.setdefault((quant["product_id"][0], quant["location_id"][0]), quant["id"])
+
+                # Repartir las líneas entre quants a actualizar y quants nuevos
+                # (si una clave se repite, prevalece la última línea)
+                quantities_to_write = {}
+                quants_to_create = {}
                 for line in adjustment_lines:
-                    if not isinstance(line, dict):
-                        return {"success": False, "error": "Cada línea debe ser un diccionario"}
-
-                    if "product_id" not in line or "location_id" not in line or "product_qty" not in line:
-                        return {"success": False, "error": "Cada línea debe contener product_id, location_id y product_qty"}
-                    # Buscar el quant existente
-                    quant_domain = [
-                        ("product_id", "=", line["product_id"]),
-                        ("location_id", "=", line["location_id"])
-                    ]
-
-                    quants = odoo.search_read(
-                        "stock.quant",
-                        quant_domain,
-                        fields=["id", "quantity"]
-                    )
-
-                    if quants:
-                        # Actualizar quant existente
-                        quant_id = quants[0]["id"]
-                        odoo.execute_method(
-                            "stock.quant",
-                            "write",
-                            [quant_id],
-                            {"inventory_quantity": line["product_qty"]}
-                        )
-                        result_ids.append(quant_id)
+                    key = (line["product_id"], line["location_id"])
+                    quant_id = quant_by_key.get(key)
+                    if quant_id:
+                        quantities_to_write[quant_id] = line["product_qty"]
                     else:
-                        # Crear nuevo quant
-                        quant_vals = {
+                        quants_to_create[key] = {
                             "product_id": line["product_id"],
                             "location_id": line["location_id"],
                             "inventory_quantity": line["product_qty"]
                         }
-                        quant_id = odoo.execute_method("stock.quant", "create", quant_vals)
-                        result_ids.append(quant_id)
+
+                # Actualizar los quants existentes: un write por cantidad distinta
+                quant_ids_by_qty = {}
+                for quant_id, qty in quantities_to_write.items():
+                    quant_ids_by_qty.setdefault(qty, []).append(quant_id)
+                for qty, quant_ids in quant_ids_by_qty.items():
+                    odoo.execute_method(
+                        "stock.quant",
+                        "write",
+                        quant_ids,
+                        {"inventory_quantity": qty}
+                    )
+                result_ids = list(quantities_to_write)
+
+                # Crear los quants nuevos con un único create múltiple
+                if quants_to_create:
+                    result_ids.extend(
+                        odoo.execute_method("stock.quant", "create", list(quants_to_create.values()))
+                    )
                 
                 # Aplicar el inventario
                 odoo.execute_method("stock.quant", "action_apply_inventory", result_ids)
@@ -255,7 +320,9 @@ def register_inventory_tools(mcp: FastMCP) -> None:
         date_from: str,
         date_to: str,
         product_ids: Optional[List[int]] = None,
-        category_id: Optional[int] = None
+        category_id: Optional[int] = None,
+        top_k: Optional[int] = None,
+        skip_inactive: bool = False
     ) -> Dict[str, Any]:
         """
         Calcula y analiza la rotación de inventario
@@ -265,20 +332,29 @@ def register_inventory_tools(mcp: FastMCP) -> None:
             date_to: Fecha final en formato YYYY-MM-DD
             product_ids: Lista de IDs de productos a analizar (opcional)
             category_id: ID de categoría de producto para filtrar (opcional)
+            top_k: Devolver solo los N productos con mayor rotación (opcional;
+                el resumen sigue calculándose sobre todos los productos)
+            skip_inactive: No calcular el valor de inventario de los productos
+                sin salidas en el período; su rotación es 0 de todos modos y su
+                avg_inventory_value se devuelve como None, sin contar en el
+                total (default: False)
 
         Returns:
             Diccionario con resultados del análisis
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
             # Validar fechas
             try:
-                date_from_dt = datetime.strptime(date_from, "%Y-%m-%d")
-                date_to_dt = datetime.strptime(date_to, "%Y-%m-%d")
+                date_from_dt = parse_date(date_from)
+                date_to_dt = parse_date(date_to)
             except ValueError:
                 return {"success": False, "error": "Formato de fecha inválido. Use YYYY-MM-DD."}
 
+            # Días del período analizado (inclusive)
+            days_in_period = (date_to_dt - date_from_dt).days + 1
+
             # Construir dominio para productos
             product_domain = [("type", "=", "product")]  # Solo productos almacenables
 
@@ -298,139 +374,146 @@ def register_inventory_tools(mcp: FastMCP) -> None:
             if not products:
                 return {"success": False, "error": "No se encontraron productos con los criterios especificados"}
             
-            # Calcular rotación para cada producto
-            product_turnover = {}
+            product_ids_found = [p["id"] for p in products]
+
+            # 1. Obtener movimientos de salida (ventas) en el período de todos
+            # los productos en una sola llamada, agrupados después por producto
+            outgoing_domain = [
+                ("product_id", "in", product_ids_found),
+                ("date", ">=", date_from),
+                ("date", "<=", date_to),
+                ("location_dest_id.usage", "=", "customer")  # Destino: cliente
+            ]
             
-            for product in products:
-                product_id = product["id"]
-                
-                # 1. Obtener movimientos de salida (ventas) en el período
-                outgoing_domain = [
-                    ("product_id", "=", product_id),
-                    ("date", ">=", date_from),
-                    ("date", "<=", date_to),
-                    ("location_dest_id.usage", "=", "customer")  # Destino: cliente
-                ]
-                
-                outgoing_moves = odoo.search_read(
-                    "stock.move",
-                    outgoing_domain,
-                    fields=["product_uom_qty", "price_unit"]
+            outgoing_moves = odoo.search_read(
+                "stock.move",
+                outgoing_domain,
+                fields=["product_id", "product_uom_qty", "price_unit"]
+            )
+
+            moves_by_product = {}
+            for move in outgoing_moves:
+                moves_by_product.setdefault(move["product_id"][0], []).append(move)
+            
+            # Con skip_inactive solo se valoran los productos con salidas
+            valued_ids = product_ids_found
+            if skip_inactive:
+                valued_ids = [pid for pid in product_ids_found if pid in moves_by_product]
+
+            # 2. Obtener valor de inventario al inicio y fin del período para
+            # todos los productos a la vez (el contexto va como argumento con nombre)
+            context_start = {
+                "to_date": date_from
+            }
+            context_end = {
+                "to_date": date_to
+            }
+
+            start_values = {}
+            end_values = {}
+            use_valuation = True
+
+            def _read_at_period_bounds(field_name):
+                """Lee un campo de los productos al inicio y al fin del período, en paralelo"""
+                start_future = _rpc_executor.submit(
+                    odoo.execute_method,
+                    "product.product",
+                    "read",
+                    valued_ids,
+                    [field_name],
+                    context=context_start
                 )
-                
-                # Calcular costo de ventas
-                cogs = sum(move["product_uom_qty"] * (move.get("price_unit") or product["standard_price"]) for move in outgoing_moves)
-                
-                # 2. Obtener valor de inventario promedio
-                # Intentar obtener valoración de inventario al inicio y fin del período
-                
+                end_rows = odoo.execute_method(
+                    "product.product",
+                    "read",
+                    valued_ids,
+                    [field_name],
+                    context=context_end
+                )
+                start_rows = start_future.result()
+                return (
+                    {r["id"]: r[field_name] for r in start_rows},
+                    {r["id"]: r[field_name] for r in end_rows}
+                )
+
+            if valued_ids:
                 # Método 1: Usar informes de valoración si están disponibles
                 try:
-                    # Valoración al inicio del período
-                    context_start = {
-                        "to_date": date_from
-                    }
-                    
-                    valuation_start = odoo.execute_method(
-                        "product.product",
-                        "read",
-                        [product_id],
-                        ["stock_value"],
-                        context_start
-                    )
-                    
-                    # Valoración al final del período
-                    context_end = {
-                        "to_date": date_to
-                    }
-                    
-                    valuation_end = odoo.execute_method(
-                        "product.product",
-                        "read",
-                        [product_id],
-                        ["stock_value"],
-                        context_end
-                    )
-                    
-                    start_value = valuation_start[0]["stock_value"] if valuation_start else 0
-                    end_value = valuation_end[0]["stock_value"] if valuation_end else 0
-                    
-                    avg_inventory_value = (start_value + end_value) / 2
-                    
+                    start_values, end_values = _read_at_period_bounds("stock_value")
                 except Exception:
                     # Método 2: Estimación basada en precio estándar y cantidad
-                    # Obtener cantidad al inicio
-                    context_start = {
-                        "to_date": date_from
-                    }
-                    
-                    qty_start = odoo.execute_method(
-                        "product.product",
-                        "read",
-                        [product_id],
-                        ["qty_available"],
-                        context_start
-                    )
-                    
-                    # Obtener cantidad al final
-                    context_end = {
-                        "to_date": date_to
-                    }
-                    
-                    qty_end = odoo.execute_method(
-                        "product.product",
-                        "read",
-                        [product_id],
-                        ["qty_available"],
-                        context_end
-                    )
-                    
-                    start_qty = qty_start[0]["qty_available"] if qty_start else 0
-                    end_qty = qty_end[0]["qty_available"] if qty_end else 0
-                    
-                    avg_qty = (start_qty + end_qty) / 2
-                    avg_inventory_value = avg_qty * product["standard_price"]
+                    start_values, end_values = _read_at_period_bounds("qty_available")
+                    use_valuation = False
+
+            # Calcular rotación para cada producto, acumulando a la vez los
+            # totales generales
+            product_turnover = []
+            total_cogs = 0.0
+            total_avg_value = 0.0
+            
+            for product in products:
+                product_id = product["id"]
+                std_price = product["standard_price"]
+                
+                # Calcular costo de ventas
+                cogs = sum(
+                    move["product_uom_qty"] * (move.get("price_unit") or std_price)
+                    for move in moves_by_product.get(product_id, ())
+                )
+                
+                if skip_inactive and product_id not in moves_by_product:
+                    # Sin salidas: no se ha valorado
+                    avg_inventory_value = None
+                elif use_valuation:
+                    avg_inventory_value = (start_values.get(product_id, 0) + end_values.get(product_id, 0)) / 2
+                else:
+                    avg_qty = (start_values.get(product_id, 0) + end_values.get(product_id, 0)) / 2
+                    avg_inventory_value = avg_qty * std_price
                 
                 # 3. Calcular métricas de rotación
                 turnover_ratio = 0
                 days_inventory = 0
                 
-                if avg_inventory_value > 0:
+                if avg_inventory_value is not None and avg_inventory_value > 0:
                     turnover_ratio = cogs / avg_inventory_value
 
                     # Días de inventario (basado en el período analizado)
-                    days_in_period = (date_to_dt - date_from_dt).days + 1
                     if turnover_ratio > 0:
                         days_inventory = days_in_period / turnover_ratio
                 
+                total_cogs += cogs
+                total_avg_value += avg_inventory_value or 0.0
+
                 # Guardar resultados
-                product_turnover[product_id] = {
-                    "name": product["name"],
-                    "default_code": product["default_code"],
-                    "category": product["categ_id"][1] if product["categ_id"] else "Sin categoría",
-                    "cogs": cogs,
-                    "avg_inventory_value": avg_inventory_value,
-                    "turnover_ratio": turnover_ratio,
-                    "days_inventory": days_inventory
-                }
+                product_turnover.append(ProductTurnover(
+                    id=product_id,
+                    name=product["name"],
+                    default_code=product["default_code"],
+                    categ_id=product["categ_id"],
+                    cogs=cogs,
+                    avg_inventory_value=avg_inventory_value,
+                    turnover_ratio=turnover_ratio,
+                    days_inventory=days_inventory
+                ))
             
-            # Ordenar productos por rotación (de mayor a menor)
-            sorted_products = sorted(
-                product_turnover.items(),
-                key=lambda x: x[1]["turnover_ratio"],
-                reverse=True
-            )
+            # Ordenar productos por rotación (de mayor a menor) sobre tuplas
+            # precalculadas; -index conserva el orden original en los empates.
+            # Con top_k basta un heap de N elementos en lugar del orden completo
+            ranking = [
+                (row.turnover_ratio, -index) for index, row in enumerate(product_turnover)
+            ]
+            if top_k is not None:
+                ranking = heapq.nlargest(top_k, ranking)
+            else:
+                ranking.sort(reverse=True)
+            sorted_products = [product_turnover[-neg_index] for _ratio, neg_index in ranking]
             
             # Calcular promedios generales
-            total_cogs = sum(data["cogs"] for _, data in product_turnover.items())
-            total_avg_value = sum(data["avg_inventory_value"] for _, data in product_turnover.items())
-            
             overall_turnover = 0
             overall_days = 0
             
             if total_avg_value > 0:
                 overall_turnover = total_cogs / total_avg_value
-                days_in_period = (date_to_dt - date_from_dt).days + 1
                 if overall_turnover > 0:
                     overall_days = days_in_period / overall_turnover
             
@@ -439,7 +522,7 @@ def register_inventory_tools(mcp: FastMCP) -> None:
                 "period": {
                     "from": date_from,
                     "to": date_to,
-                    "days": (date_to_dt - date_from_dt).days + 1
+                    "days": days_in_period
                 },
                 "summary": {
                     "product_count": len(products),
@@ -448,12 +531,34 @@ def register_inventory_tools(mcp: FastMCP) -> None:
                     "overall_turnover_ratio": overall_turnover,
                     "overall_days_inventory": overall_days
                 },
-                "products": [
-                    {"id": k, **v} for k, v in sorted_products
-                ]
+                # Solo las filas devueltas se convierten a diccionario
+                "products": [row.to_dict() for row in sorted_products]
             }
             
             return {"success": True, "result": result}
             
         except Exception as e:
             return {"success": False, "error": str(e)}
+    
+    @mcp.tool(description="Limpia la caché de metadatos de inventario (ubicaciones y modelo de ajustes)")
+    def clear_inventory_cache() -> Dict[str, Any]:
+        """
+        Limpia la caché de metadatos de inventario
+
+        Útil tras cambiar datos maestros en Odoo (p. ej. renombrar ubicaciones)
+        para que las siguientes consultas vuelvan a leerlos del servidor.
+
+        Returns:
+            Respuesta con el resultado de la operación
+        """
+        global _INVENTORY_MODEL_CACHE
+        cached_locations = _resolve_location.cache_info().currsize
+        _resolve_location.cache_clear()
+        _INVENTORY_MODEL_CACHE = None
+
+        return {
+            "success": True,
+            "result": {
+                "cleared_locations": cached_locations
+            }
+        }
@@ -2,23 +2,87 @@
 產品成本分析工具 - 專注於進口貿易的成本結構
 """
 
+import heapq
+from itertools import chain, islice
+from operator import itemgetter
 from typing import Dict, List, Any, Optional
 from fastmcp import FastMCP
 from .odoo_client import get_odoo_client
 
+# 分批讀取時每批的產品數
+_BATCH_SIZE = 200
+
+# 可由 Odoo 排序的欄位（list_price 為儲存欄位）：依序讀到 limit 筆即停止
+# 以 id 作為次要排序，分批讀取時每頁的內容才會穩定
+_SERVER_ORDER = {
+    "sales_price": "list_price desc, id"
+}
+
+# 需在本地排序的欄位：毛利由 list_price 與 standard_price 計算，standard_price
+# 為非儲存的計算欄位，Odoo 無法依其排序
+_SORT_KEYS = {
+    "profit_margin": itemgetter("profit_margin"),
+    "profit_amount": itemgetter("profit_amount"),
+    "cost": itemgetter("landed_cost")
+}
+
+# 本地排序時最多讀取的產品數（與原本單次查詢的上限相同）
+_LOCAL_SORT_MAX_PRODUCTS = 500
+
+# 成本分析需要的欄位
+_ANALYSIS_FIELDS = [
+    "id", "name", "default_code",
+    "list_price", "standard_price",
+    "categ_id", "currency_id",
+    # 自訂成本欄位
+    "x_base_cost_rmb",
+    "x_exchange_rate",
+    "x_service_fee_rate",
+    "x_shipping_fee",
+    "x_ocean_fee",
+    "x_si_fee_rate"
+]
+
+# 單一產品成本明細需要的欄位
+_DETAIL_FIELDS = _ANALYSIS_FIELDS + ["x_cost_calculated_date"]
+
+
+def _analyze_product(p: Dict[str, Any], currency: str) -> Dict[str, Any]:
+    """計算單一產品的毛利與成本明細"""
+    list_price = p.get("list_price", 0)
+    standard_price = p.get("standard_price", 0)
+    categ = p.get("categ_id")
+    product_currency = p.get("currency_id")
+
+    # 計算毛利
+    profit_amount = list_price - standard_price
+    profit_margin = (profit_amount / list_price * 100) if list_price > 0 else 0
+
+    return {
+        "id": p.get("id"),
+        "name": p.get("name", "N/A"),
+        "default_code": p.get("default_code", "N/A"),
+        "category": categ[1] if categ else "N/A",
+        "sales_price": list_price,
+        "landed_cost": standard_price,
+        "profit_amount": profit_amount,
+        "profit_margin": round(profit_margin, 2),
+        "currency": product_currency[1] if product_currency else currency,
+        # 成本明細
+        "cost_breakdown": {
+            "base_cost_rmb": p.get("x_base_cost_rmb", 0),
+            "exchange_rate": p.get("x_exchange_rate", 0),
+            "service_fee_rate": p.get("x_service_fee_rate", 0),
+            "shipping_fee": p.get("x_shipping_fee", 0),
+            "ocean_fee": p.get("x_ocean_fee", 0),
+            "si_fee_rate": p.get("x_si_fee_rate", 0)
+        }
+    }
+
 
 def register_product_cost_tools(mcp: FastMCP) -> None:
     """註冊產品成本分析相關工具"""
 
-    # Cache Odoo connection to avoid reconnecting on every tool call
-    _odoo_client_cache = None
-
-    def _get_odoo():
-        nonlocal _odoo_client_cache
-        if _odoo_client_cache is None:
-            _odoo_client_cache = get_odoo_client()
-        return _odoo_client_cache
-
     @mcp.tool(description="分析產品的成本結構、毛利率，並支援排序和篩選")
     def analyze_product_costs(
         limit: int = 20,
@@ -68,7 +132,7 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
             # 查詢毛利率 > 30% 的產品
             analyze_product_costs(limit=50, min_profit_margin=0.3)
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
             # 限制最大查詢數量
@@ -80,102 +144,52 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
             if category_id:
                 domain.append(("categ_id", "=", category_id))
 
-            # 查詢產品，只要必要欄位
-            products = odoo.execute_method(
+            # Odoo 可排序時依排序分批讀取，湊滿 limit 筆即停止（不過濾時一批
+            # 剛好 limit 筆）；需本地排序時以 id 排序，單次讀取最多
+            # _LOCAL_SORT_MAX_PRODUCTS 筆
+            sort_key = _SORT_KEYS.get(sort_by)
+            if sort_key is not None:
+                batch_size = _LOCAL_SORT_MAX_PRODUCTS
+            elif min_profit_margin:
+                batch_size = _BATCH_SIZE
+            else:
+                batch_size = max(limit, 1)
+            products = odoo.iter_search_read(
                 "product.template",
-                "search_read",
-                domain=domain,
-                fields=[
-                    "id", "name", "default_code",
-                    "list_price", "standard_price",
-                    "categ_id", "currency_id",
-                    # 自訂成本欄位
-                    "x_base_cost_rmb",
-                    "x_exchange_rate",
-                    "x_service_fee_rate",
-                    "x_shipping_fee",
-                    "x_ocean_fee",
-                    "x_si_fee_rate",
-                    "x_landed_cost",
-                    "x_margin",
-                    "x_margin_percent"
-                ],
-                limit=500  # 查詢更多產品以便排序，最終返回 limit 筆
+                domain,
+                _ANALYSIS_FIELDS,
+                order=_SERVER_ORDER.get(sort_by, "id"),
+                batch_size=batch_size
             )
+            if sort_key is not None:
+                products = islice(products, _LOCAL_SORT_MAX_PRODUCTS)
 
-            if not products:
+            first_product = next(products, None)
+            if first_product is None:
                 return {
                     "success": False,
                     "error": "未找到符合條件的產品"
                 }
 
-            # 計算成本分析
-            analyzed_products = []
-            for p in products:
-                list_price = p.get("list_price", 0)
-                standard_price = p.get("standard_price", 0)
-
-                # 計算毛利
-                profit_amount = list_price - standard_price
-                profit_margin = (profit_amount / list_price * 100) if list_price > 0 else 0
-
-                # 過濾毛利率
-                if min_profit_margin and (profit_margin / 100) < min_profit_margin:
-                    continue
-
-                analyzed_products.append({
-                    "id": p.get("id"),
-                    "name": p.get("name", "N/A"),
-                    "default_code": p.get("default_code", "N/A"),
-                    "category": p.get("categ_id", [False, "N/A"])[1] if p.get("categ_id") else "N/A",
-                    "sales_price": list_price,
-                    "landed_cost": standard_price,
-                    "profit_amount": profit_amount,
-                    "profit_margin": round(profit_margin, 2),
-                    "currency": p.get("currency_id", [False, currency])[1] if p.get("currency_id") else currency,
-                    # 成本明細
-                    "cost_breakdown": {
-                        "base_cost_rmb": p.get("x_base_cost_rmb", 0),
-                        "exchange_rate": p.get("x_exchange_rate", 0),
-                        "service_fee_rate": p.get("x_service_fee_rate", 0),
-                        "shipping_fee": p.get("x_shipping_fee", 0),
-                        "ocean_fee": p.get("x_ocean_fee", 0),
-                        "si_fee_rate": p.get("x_si_fee_rate", 0)
-                    }
-                })
-
-            # 排序
-            sort_keys = {
-                "profit_margin": lambda x: x["profit_margin"],
-                "profit_amount": lambda x: x["profit_amount"],
-                "sales_price": lambda x: x["sales_price"],
-                "cost": lambda x: x["landed_cost"]
-            }
+            analyzed = (_analyze_product(p, currency) for p in chain((first_product,), products))
+            if min_profit_margin:
+                analyzed = (p for p in analyzed if p["profit_margin"] / 100 >= min_profit_margin)
 
-            if sort_by in sort_keys:
-                analyzed_products.sort(key=sort_keys[sort_by], reverse=True)
-
-            # 取前 limit 筆
-            analyzed_products = analyzed_products[:limit]
-
-            # 計算統計摘要
-            if analyzed_products:
-                margins = [p["profit_margin"] for p in analyzed_products]
-                summary = {
-                    "total_products": len(analyzed_products),
-                    "avg_profit_margin": round(sum(margins) / len(margins), 2),
-                    "highest_margin": max(margins),
-                    "lowest_margin": min(margins),
-                    "total_profit": sum(p["profit_amount"] for p in analyzed_products)
-                }
+            # 取前 limit 筆：本地排序時用 heap 取最大的 limit 筆，不需整份排序
+            if sort_key is not None:
+                analyzed_products = heapq.nlargest(limit, analyzed, key=sort_key)
             else:
-                summary = {
-                    "total_products": 0,
-                    "avg_profit_margin": 0,
-                    "highest_margin": 0,
-                    "lowest_margin": 0,
-                    "total_profit": 0
-                }
+                analyzed_products = list(islice(analyzed, limit))
+
+            # 計算統計摘要（毛利率過濾後可能沒有產品）
+            margins = [p["profit_margin"] for p in analyzed_products]
+            summary = {
+                "total_products": len(analyzed_products),
+                "avg_profit_margin": round(sum(margins) / len(margins), 2) if margins else 0,
+                "highest_margin": max(margins, default=0),
+                "lowest_margin": min(margins, default=0),
+                "total_profit": sum(p["profit_amount"] for p in analyzed_products)
+            }
 
             return {
                 "success": True,
@@ -212,43 +226,32 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
             # 用料號查詢
             get_product_cost_detail(product_code="GT-001S - ACC")
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
-            # 構建查詢條件
             if product_id:
-                domain = [("id", "=", product_id)]
+                # 已知 ID 時直接讀取，不需在伺服器端評估 domain（已刪除的 ID 會回傳空列表）
+                products = odoo.execute_method(
+                    "product.template",
+                    "read",
+                    [product_id],
+                    _DETAIL_FIELDS
+                )
             elif product_code:
-                domain = [("default_code", "=", product_code)]
+                # 依料號查詢產品
+                products = odoo.execute_method(
+                    "product.template",
+                    "search_read",
+                    domain=[("default_code", "=", product_code)],
+                    fields=_DETAIL_FIELDS,
+                    limit=1
+                )
             else:
                 return {
                     "success": False,
                     "error": "必須提供 product_id 或 product_code"
                 }
 
-            # 查詢產品
-            products = odoo.execute_method(
-                "product.template",
-                "search_read",
-                domain=domain,
-                fields=[
-                    "id", "name", "default_code",
-                    "list_price", "standard_price",
-                    "categ_id", "currency_id",
-                    "x_base_cost_rmb",
-                    "x_exchange_rate",
-                    "x_service_fee_rate",
-                    "x_shipping_fee",
-                    "x_ocean_fee",
-                    "x_si_fee_rate",
-                    "x_landed_cost",
-                    "x_margin",
-                    "x_margin_percent",
-                    "x_cost_calculated_date"
-                ],
-                limit=1
-            )
-
             if not products:
                 return {
                     "success": False,
@@ -260,13 +263,15 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
             standard_price = p.get("standard_price", 0)
             base_cost_rmb = p.get("x_base_cost_rmb", 0)
             exchange_rate = p.get("x_exchange_rate", 0)
+            service_fee_rate = p.get("x_service_fee_rate", 0)
+            si_fee_rate = p.get("x_si_fee_rate", 0)
 
             # 計算各項成本（PHP）
             base_cost_php = base_cost_rmb * exchange_rate if exchange_rate else 0
-            service_fee = base_cost_php * p.get("x_service_fee_rate", 0) if base_cost_php else 0
+            service_fee = base_cost_php * service_fee_rate if base_cost_php else 0
             shipping_fee = p.get("x_shipping_fee", 0)
             ocean_fee = p.get("x_ocean_fee", 0)
-            si_fee = (base_cost_php + service_fee + shipping_fee + ocean_fee) * p.get("x_si_fee_rate", 0)
+            si_fee = (base_cost_php + service_fee + shipping_fee + ocean_fee) * si_fee_rate
 
             profit_amount = list_price - standard_price
             profit_margin = (profit_amount / list_price * 100) if list_price > 0 else 0
@@ -291,11 +296,11 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
                     "exchange_rate": exchange_rate,
                     "base_cost_php": round(base_cost_php, 2),
                     "service_fee": round(service_fee, 2),
-                    "service_fee_rate_percent": p.get("x_service_fee_rate", 0) * 100,
+                    "service_fee_rate_percent": service_fee_rate * 100,
                     "shipping_fee": shipping_fee,
                     "ocean_fee": ocean_fee,
                     "si_fee": round(si_fee, 2),
-                    "si_fee_rate_percent": p.get("x_si_fee_rate", 0) * 100,
+                    "si_fee_rate_percent": si_fee_rate * 100,
                     "total_landed_cost": standard_price
                 },
                 "metadata": {
@@ -326,15 +331,26 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
         Example:
             compare_product_costs(product_codes=["GT-001S - ACC", "Q348L", "HP1000"])
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
+            # 去除重複料號（保留輸入順序）
+            product_codes = list(dict.fromkeys(product_codes))
+
             if len(product_codes) > 10:
                 return {
                     "success": False,
                     "error": "最多只能比較 10 個產品"
                 }
 
+            # 沒有料號時不需查詢
+            if not product_codes:
+                return {
+                    "success": True,
+                    "comparison": [],
+                    "total_compared": 0
+                }
+
             products = odoo.execute_method(
                 "product.template",
                 "search_read",
@@ -354,14 +370,21 @@ def register_product_cost_tools(mcp: FastMCP) -> None:
                     "error": "未找到任何產品"
                 }
 
+            # 依輸入的料號順序輸出，未找到的料號直接略過
+            by_code = {p["default_code"]: p for p in products}
             comparison = []
-            for p in products:
+            for code in product_codes:
+                p = by_code.get(code)
+                if not p:
+                    continue
+                list_price = p.get("list_price", 0)
+                standard_price = p.get("standard_price", 0)
                 comparison.append({
                     "code": p.get("default_code", "N/A"),
                     "name": p.get("name", "N/A"),
-                    "sales_price": p.get("list_price", 0),
-                    "cost": p.get("standard_price", 0),
-                    "profit": p.get("list_price", 0) - p.get("standard_price", 0),
+                    "sales_price": list_price,
+                    "cost": standard_price,
+                    "profit": list_price - standard_price,
                     "margin_percent": round(p.get("x_margin_percent", 0), 2),
                     "base_cost_rmb": p.get("x_base_cost_rmb", 0),
                     "exchange_rate": p.get("x_exchange_rate", 0)
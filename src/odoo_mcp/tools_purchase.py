@@ -2,8 +2,9 @@
 Implementación de herramientas (tools) para compras en MCP-Odoo
 """
 
+import heapq
 from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from fastmcp import FastMCP
 
 from .models import (
@@ -12,14 +13,20 @@ from .models import (
     SupplierPerformanceInput
 )
 from .odoo_client import get_odoo_client
+from .utils import parse_date
+
+# Filtros de search_purchase_orders: (argumento, campo, operador, ¿validar como fecha?)
+_ORDER_FILTERS = (
+    ("partner_id", "partner_id", "=", False),
+    ("date_from", "date_order", ">=", True),
+    ("date_to", "date_order", "<=", True),
+    ("state", "state", "=", False),
+)
+
 
 def register_purchase_tools(mcp: FastMCP) -> None:
     """Registra herramientas relacionadas con compras"""
 
-    # Helper function to get Odoo client
-    def _get_odoo():
-        return get_odoo_client()
-
     @mcp.tool(description="Busca órdenes de compra con filtros avanzados")
     def search_purchase_orders(
         partner_id: Optional[int] = None,
@@ -45,31 +52,28 @@ def register_purchase_tools(mcp: FastMCP) -> None:
         Returns:
             Diccionario con resultados de la búsqueda
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
-            # Construir dominio de búsqueda
+            # Construir dominio de búsqueda a partir de la tabla de filtros
+            filter_values = {
+                "partner_id": partner_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "state": state
+            }
             domain = []
 
-            if partner_id:
-                domain.append(("partner_id", "=", partner_id))
-
-            if date_from:
-                try:
-                    datetime.strptime(date_from, "%Y-%m-%d")
-                    domain.append(("date_order", ">=", date_from))
-                except ValueError:
-                    return {"success": False, "error": f"Formato de fecha inválido: {date_from}. Use YYYY-MM-DD."}
-
-            if date_to:
-                try:
-                    datetime.strptime(date_to, "%Y-%m-%d")
-                    domain.append(("date_order", "<=", date_to))
-                except ValueError:
-                    return {"success": False, "error": f"Formato de fecha inválido: {date_to}. Use YYYY-MM-DD."}
-
-            if state:
-                domain.append(("state", "=", state))
+            for arg_name, field_name, operator, is_date in _ORDER_FILTERS:
+                value = filter_values[arg_name]
+                if not value:
+                    continue
+                if is_date:
+                    try:
+                        parse_date(value)
+                    except ValueError:
+                        return {"success": False, "error": f"Formato de fecha inválido: {value}. Use YYYY-MM-DD."}
+                domain.append((field_name, operator, value))
 
             # Campos a recuperar
             fields = [
@@ -78,18 +82,26 @@ def register_purchase_tools(mcp: FastMCP) -> None:
                 "date_planned", "date_approve"
             ]
 
-            # Ejecutar búsqueda
-            orders = odoo.search_read(
+            # Ejecutar búsqueda con execute_method: a diferencia de search_read
+            # del cliente, no convierte los errores en una lista vacía, que aquí
+            # daría un total_count de 0 aparentemente válido
+            search_kwargs = {"fields": fields, "limit": limit, "offset": offset}
+            if order:
+                search_kwargs["order"] = order
+            orders = odoo.execute_method(
                 "purchase.order",
+                "search_read",
                 domain,
-                fields=fields,
-                limit=limit,
-                offset=offset,
-                order=order
+                **search_kwargs
             )
             
-            # Obtener el conteo total sin límite para paginación
-            total_count = odoo.execute_method("purchase.order", "search_count", domain)
+            # Obtener el conteo total sin límite para paginación. Si la página no
+            # se llenó y no está vacía (o es la primera), ya es la última: el total
+            # es offset + filas devueltas y no hace falta otra llamada
+            if len(orders) < limit and (orders or not offset):
+                total_count = offset + len(orders)
+            else:
+                total_count = odoo.execute_method("purchase.order", "search_count", domain)
             
             return {
                 "success": True, 
@@ -123,7 +135,7 @@ def register_purchase_tools(mcp: FastMCP) -> None:
         Returns:
             Respuesta con el resultado de la operación
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
             # Preparar valores para la orden
@@ -134,7 +146,7 @@ def register_purchase_tools(mcp: FastMCP) -> None:
 
             if date_order:
                 try:
-                    datetime.strptime(date_order, "%Y-%m-%d")
+                    parse_date(date_order)
                     order_vals["date_order"] = date_order
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_order}. Use YYYY-MM-DD."}
@@ -147,17 +159,17 @@ def register_purchase_tools(mcp: FastMCP) -> None:
                 if "product_id" not in line or "product_qty" not in line:
                     return {"success": False, "error": "Cada línea debe contener product_id y product_qty"}
 
-                line_vals = [
-                    0, 0, {
-                        "product_id": line["product_id"],
-                        "product_qty": line["product_qty"]
-                    }
-                ]
+                vals = {
+                    "product_id": line["product_id"],
+                    "product_qty": line["product_qty"]
+                }
 
-                if "price_unit" in line and line["price_unit"] is not None:
-                    line_vals[2]["price_unit"] = line["price_unit"]
+                price_unit = line.get("price_unit")
+                if price_unit is not None:
+                    vals["price_unit"] = price_unit
 
-                order_vals["order_line"].append(line_vals)
+                # Comando x2many (0, 0, vals): crear línea
+                order_vals["order_line"].append((0, 0, vals))
 
             # Crear orden
             order_id = odoo.execute_method("purchase.order", "create", order_vals)
@@ -180,7 +192,8 @@ def register_purchase_tools(mcp: FastMCP) -> None:
     def analyze_supplier_performance(
         date_from: str,
         date_to: str,
-        supplier_ids: Optional[List[int]] = None
+        supplier_ids: Optional[List[int]] = None,
+        top_n: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Analiza el rendimiento de los proveedores en un período específico
@@ -189,17 +202,19 @@ def register_purchase_tools(mcp: FastMCP) -> None:
             date_from: Fecha inicial en formato YYYY-MM-DD
             date_to: Fecha final en formato YYYY-MM-DD
             supplier_ids: Lista de IDs de proveedores a analizar (opcional)
+            top_n: Devolver solo los N proveedores con mayor monto comprado (opcional;
+                el resumen sigue calculándose sobre todos los proveedores)
 
         Returns:
             Diccionario con resultados del análisis
         """
-        odoo = _get_odoo()
+        odoo = get_odoo_client()
 
         try:
             # Validar fechas
             try:
-                datetime.strptime(date_from, "%Y-%m-%d")
-                datetime.strptime(date_to, "%Y-%m-%d")
+                parse_date(date_from)
+                parse_date(date_to)
             except ValueError:
                 return {"success": False, "error": "Formato de fecha inválido. Use YYYY-MM-DD."}
 
@@ -214,66 +229,68 @@ def register_purchase_tools(mcp: FastMCP) -> None:
             if supplier_ids:
                 domain.append(("partner_id", "in", supplier_ids))
             
-            # Obtener datos de compras
-            purchase_data = odoo.search_read(
+            # Totales por proveedor agrupados en el servidor (GROUP BY partner_id)
+            supplier_groups = odoo.execute_method(
                 "purchase.order",
+                "read_group",
                 domain,
-                fields=[
-                    "name", "partner_id", "date_order", "amount_total", 
-                    "date_approve", "date_planned", "effective_date"
-                ]
+                ["partner_id", "amount_total:sum"],
+                ["partner_id"],
+                lazy=False
             )
             
-            # Agrupar por proveedor
             supplier_data = {}
-            for order in purchase_data:
+            for group in supplier_groups:
+                supplier_id = group["partner_id"][0] if group["partner_id"] else 0
+                supplier_name = group["partner_id"][1] if group["partner_id"] else "Desconocido"
+                
+                supplier_data[supplier_id] = {
+                    "name": supplier_name,
+                    "order_count": group["__count"],
+                    "total_amount": group["amount_total"] or 0,
+                    "delay_sum": 0,
+                    "delay_count": 0,
+                    "on_time_delivery_count": 0,
+                    "late_delivery_count": 0,
+                    "avg_delay_days": 0
+                }
+            
+            # Solo las órdenes con ambas fechas aportan métricas de entrega
+            delivered_orders = odoo.execute_method(
+                "purchase.order",
+                "search_read",
+                domain + [("effective_date", "!=", False), ("date_planned", "!=", False)],
+                fields=["partner_id", "date_planned", "effective_date"]
+            )
+            
+            for order in delivered_orders:
                 supplier_id = order["partner_id"][0] if order["partner_id"] else 0
-                supplier_name = order["partner_id"][1] if order["partner_id"] else "Desconocido"
+                data = supplier_data.get(supplier_id)
+                if data is None:
+                    # Orden creada entre ambas consultas: no figura en los totales
+                    continue
                 
-                if supplier_id not in supplier_data:
-                    supplier_data[supplier_id] = {
-                        "name": supplier_name,
-                        "order_count": 0,
-                        "total_amount": 0,
-                        "orders": [],
-                        "on_time_delivery_count": 0,
-                        "late_delivery_count": 0,
-                        "avg_delay_days": 0
-                    }
+                # Calcular métricas de entrega a tiempo
+                effective_date = date.fromisoformat(order["effective_date"][:10])
+                planned_date = date.fromisoformat(order["date_planned"][:10])
                 
-                supplier_data[supplier_id]["order_count"] += 1
-                supplier_data[supplier_id]["total_amount"] += order["amount_total"]
+                delay_days = (effective_date - planned_date).days
                 
-                # Calcular métricas de entrega a tiempo
-                if order.get("effective_date") and order.get("date_planned"):
-                    effective_date = datetime.strptime(order["effective_date"].split(" ")[0], "%Y-%m-%d")
-                    planned_date = datetime.strptime(order["date_planned"].split(" ")[0], "%Y-%m-%d")
-                    
-                    delay_days = (effective_date - planned_date).days
-                    
-                    order_info = {
-                        "id": order["id"],
-                        "name": order["name"],
-                        "amount": order["amount_total"],
-                        "date_order": order["date_order"],
-                        "planned_date": order["date_planned"],
-                        "effective_date": order["effective_date"],
-                        "delay_days": delay_days
-                    }
-                    
-                    supplier_data[supplier_id]["orders"].append(order_info)
-                    
-                    if delay_days <= 0:
-                        supplier_data[supplier_id]["on_time_delivery_count"] += 1
-                    else:
-                        supplier_data[supplier_id]["late_delivery_count"] += 1
+                data["delay_sum"] += delay_days
+                data["delay_count"] += 1
+                
+                if delay_days <= 0:
+                    data["on_time_delivery_count"] += 1
+                else:
+                    data["late_delivery_count"] += 1
             
             # Calcular métricas adicionales
             for supplier_id, data in supplier_data.items():
                 # Calcular promedio de días de retraso
-                delay_days = [order["delay_days"] for order in data["orders"] if "delay_days" in order]
-                if delay_days:
-                    data["avg_delay_days"] = sum(delay_days) / len(delay_days)
+                delay_sum = data.pop("delay_sum")
+                delay_count = data.pop("delay_count")
+                if delay_count:
+                    data["avg_delay_days"] = delay_sum / delay_count
                 
                 # Calcular porcentaje de entregas a tiempo
                 total_deliveries = data["on_time_delivery_count"] + data["late_delivery_count"]
@@ -281,16 +298,20 @@ def register_purchase_tools(mcp: FastMCP) -> None:
                     data["on_time_delivery_rate"] = (data["on_time_delivery_count"] / total_deliveries) * 100
                 else:
                     data["on_time_delivery_rate"] = 0
-                
-                # Eliminar lista detallada de órdenes para reducir tamaño de respuesta
-                data.pop("orders", None)
             
-            # Ordenar proveedores por monto total
-            top_suppliers = sorted(
-                supplier_data.items(),
-                key=lambda x: x[1]["total_amount"],
-                reverse=True
-            )
+            # Ordenar proveedores por monto total; con top_n basta un heap de N elementos
+            if top_n is not None:
+                top_suppliers = heapq.nlargest(
+                    top_n,
+                    supplier_data.items(),
+                    key=lambda x: x[1]["total_amount"]
+                )
+            else:
+                top_suppliers = sorted(
+                    supplier_data.items(),
+                    key=lambda x: x[1]["total_amount"],
+                    reverse=True
+                )
             
             # Preparar resultado
             result = {
@@ -300,8 +321,8 @@ def register_purchase_tools(mcp: FastMCP) -> None:
                 },
                 "summary": {
                     "supplier_count": len(supplier_data),
-                    "order_count": len(purchase_data),
-                    "total_amount": sum(order["amount_total"] for order in purchase_data)
+                    "order_count": sum(data["order_count"] for data in supplier_data.values()),
+                    "total_amount": sum(data["total_amount"] for data in supplier_data.values())
                 },
                 "suppliers": [
                     {"id": k, **v} for k, v in top_suppliers
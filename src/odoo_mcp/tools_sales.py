@@ -2,8 +2,11 @@
 Implementación de herramientas (tools) para ventas en MCP-Odoo
 """
 
-from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple, Union
+from datetime import timedelta
 from fastmcp import FastMCP
 
 from .models import (
@@ -12,23 +15,152 @@ from .models import (
     SalesPerformanceInput
 )
 from .odoo_client import get_odoo_client
+from .utils import cache_response, cached_response, parse_date
+
+# Campos por defecto de search_sales_orders
+_ORDER_FIELDS = [
+    "name", "partner_id", "date_order", "amount_total",
+    "state", "invoice_status", "user_id"
+]
+
+# Claves obligatorias de cada línea de create_sales_order
+_REQUIRED_LINE_KEYS = frozenset({"product_id", "product_uom_qty"})
+
+# Estados válidos de sale.order
+_VALID_STATES = frozenset({"draft", "sent", "sale", "done", "cancel"})
+
+# Caché de analyze_sales_performance: (date_from, date_to, group_by) -> (expira, respuesta).
+# Los paneles repiten el mismo período cada pocos segundos; create_sales_order la vacía
+_perf_cache: Dict[tuple, tuple] = {}
+_PERF_CACHE_TTL = 60
+_PERF_CACHE_MAX_SIZE = 256
+
+
+def _line_command(line: Dict[str, Any]) -> Tuple[int, int, Dict[str, Any]]:
+    """Comando x2many (0, 0, vals) para crear una línea de pedido ya validada"""
+    vals = {
+        "product_id": line["product_id"],
+        "product_uom_qty": line["product_uom_qty"]
+    }
+    price_unit = line.get("price_unit")
+    if price_unit is not None:
+        vals["price_unit"] = price_unit
+    return (0, 0, vals)
+
+def _sum_orders(odoo, domain) -> Tuple[int, float]:
+    """Devuelve (número de pedidos, suma de amount_total) agregados en el servidor"""
+    totals = odoo.execute_method(
+        "sale.order",
+        "read_group",
+        domain,
+        ["amount_total:sum"],
+        [],
+        lazy=False
+    )
+    if not totals:
+        return 0, 0
+    return totals[0]["__count"], totals[0]["amount_total"] or 0
+
+def _cache_perf_response(cache_key: tuple, now: float, response: Dict[str, Any]) -> None:
+    """Guarda una respuesta de analyze_sales_performance durante _PERF_CACHE_TTL segundos"""
+    cache_response(_perf_cache, cache_key, now, _PERF_CACHE_TTL, response, _PERF_CACHE_MAX_SIZE)
+
+
+@dataclass(frozen=True, slots=True)
+class _Grouping:
+    """Cómo agrupar analyze_sales_performance para un valor de group_by"""
+    model: str
+    # Prefijo para llevar el dominio de sale.order al modelo agrupado
+    domain_prefix: str
+    groupby: str
+    aggregates: Tuple[str, ...]
+    orderby: str
+    # Clave de salida -> campo del resultado de read_group
+    values: Tuple[Tuple[str, str], ...]
+    result_key: str
+    limit: Optional[int] = None
+    # Sin pedidos en el período no se devuelve la lista
+    skip_if_empty: bool = False
+
+
+_GROUPINGS = {
+    "product": _Grouping(
+        model="sale.order.line",
+        domain_prefix="order_id.",
+        groupby="product_id",
+        aggregates=("product_uom_qty:sum", "price_subtotal:sum"),
+        orderby="price_subtotal desc",
+        values=(("quantity", "product_uom_qty"), ("amount", "price_subtotal")),
+        result_key="products",
+        limit=10,
+        skip_if_empty=True
+    ),
+    "customer": _Grouping(
+        model="sale.order",
+        domain_prefix="",
+        groupby="partner_id",
+        aggregates=("amount_total:sum",),
+        orderby="amount_total desc",
+        values=(("order_count", "__count"), ("amount", "amount_total")),
+        result_key="customers",
+        limit=10
+    ),
+    "salesperson": _Grouping(
+        model="sale.order",
+        domain_prefix="",
+        groupby="user_id",
+        aggregates=("amount_total:sum",),
+        orderby="amount_total desc",
+        values=(("order_count", "__count"), ("amount", "amount_total")),
+        result_key="salespersons"
+    ),
+}
+
+
+def _read_groups(odoo, grouping: _Grouping, domain) -> List[Dict[str, Any]]:
+    """Ejecuta el read_group de una agrupación y da formato a sus filas"""
+    kwargs = {"orderby": grouping.orderby, "lazy": False}
+    if grouping.limit is not None:
+        kwargs["limit"] = grouping.limit
+
+    groups = odoo.execute_method(
+        grouping.model,
+        "read_group",
+        [(grouping.domain_prefix + field, operator, value) for field, operator, value in domain],
+        [grouping.groupby, *grouping.aggregates],
+        [grouping.groupby],
+        **kwargs
+    )
+
+    rows = []
+    for group in groups:
+        key = group[grouping.groupby]
+        row = {
+            "id": key[0] if key else 0,
+            "name": key[1] if key else "Desconocido"
+        }
+        for output_key, field in grouping.values:
+            row[output_key] = group[field] or 0
+        rows.append(row)
+    return rows
 
 def register_sales_tools(mcp: FastMCP) -> None:
     """Registra herramientas relacionadas con ventas"""
 
-    # Helper function to get Odoo client
-    def _get_odoo():
-        return get_odoo_client()
+    # Las herramientas son async y ejecutan las llamadas XML-RPC (bloqueantes)
+    # en hilos con asyncio.to_thread, para no detener el bucle de eventos del
+    # servidor MCP mientras esperan a Odoo
 
     @mcp.tool(description="Busca pedidos de venta con filtros avanzados")
-    def search_sales_orders(
+    async def search_sales_orders(
         partner_id: Optional[int] = None,
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
-        state: Optional[str] = None,
+        state: Optional[Union[str, List[str]]] = None,
         limit: int = 20,
         offset: int = 0,
-        order: Optional[str] = None
+        order: Optional[str] = None,
+        fields: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
         Busca pedidos de venta según los filtros especificados
@@ -37,18 +169,24 @@ def register_sales_tools(mcp: FastMCP) -> None:
             partner_id: Filtrar por cliente ID (opcional)
             date_from: Fecha inicial en formato YYYY-MM-DD (opcional)
             date_to: Fecha final en formato YYYY-MM-DD (opcional)
-            state: Estado del pedido, ej: 'sale', 'draft', 'done' (opcional)
+            state: Estado del pedido, ej: 'sale', 'draft', 'done', o una lista de
+                estados, ej: ['draft', 'sent'] (opcional)
             limit: Límite de resultados (default: 20)
             offset: Offset para paginación (default: 0)
             order: Criterio de ordenación, ej: 'date_order DESC' (opcional)
+            fields: Campos a devolver de cada pedido (opcional; por defecto
+                name, partner_id, date_order, amount_total, state,
+                invoice_status y user_id)
 
         Returns:
             Diccionario con resultados de la búsqueda
         """
-        odoo = _get_odoo()
+        odoo = await asyncio.to_thread(get_odoo_client)
 
         try:
-            # Construir dominio de búsqueda
+            # Construir dominio de búsqueda. date_order es Datetime: las fechas se
+            # pasan como límites completos del día (una fecha sola equivale a las
+            # 00:00:00 y dejaría fuera los pedidos del último día)
             domain = []
 
             if partner_id:
@@ -56,39 +194,60 @@ def register_sales_tools(mcp: FastMCP) -> None:
 
             if date_from:
                 try:
-                    datetime.strptime(date_from, "%Y-%m-%d")
-                    domain.append(("date_order", ">=", date_from))
+                    parse_date(date_from)
+                    domain.append(("date_order", ">=", f"{date_from} 00:00:00"))
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_from}. Use YYYY-MM-DD."}
 
             if date_to:
                 try:
-                    datetime.strptime(date_to, "%Y-%m-%d")
-                    domain.append(("date_order", "<=", date_to))
+                    parse_date(date_to)
+                    domain.append(("date_order", "<=", f"{date_to} 23:59:59"))
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_to}. Use YYYY-MM-DD."}
 
             if state:
-                domain.append(("state", "=", state))
-
-            # Campos a recuperar
-            fields = [
-                "name", "partner_id", "date_order", "amount_total",
-                "state", "invoice_status", "user_id", "order_line"
-            ]
-
-            # Ejecutar búsqueda
-            orders = odoo.search_read(
+                # Validar los estados localmente: un valor inválido no llega a Odoo
+                states = [state] if isinstance(state, str) else list(state)
+                invalid_states = set(states) - _VALID_STATES
+                if invalid_states:
+                    return {
+                        "success": False,
+                        "error": f"Estados inválidos: {sorted(invalid_states)}. Use: {sorted(_VALID_STATES)}."
+                    }
+                if len(states) == 1:
+                    domain.append(("state", "=", states[0]))
+                else:
+                    domain.append(("state", "in", states))
+
+            # Campos a recuperar (sin order_line: la lista de IDs de líneas de
+            # cada pedido es lo más pesado de la respuesta y no se usa)
+            if not fields:
+                fields = _ORDER_FIELDS
+
+            # Ejecutar búsqueda con execute_method: a diferencia de search_read
+            # del cliente, no convierte los errores (p. ej. un campo inexistente
+            # en fields) en una lista vacía que parecería un resultado válido
+            search_kwargs = {"fields": fields, "limit": limit, "offset": offset}
+            if order:
+                search_kwargs["order"] = order
+            orders = await asyncio.to_thread(
+                odoo.execute_method,
                 "sale.order",
+                "search_read",
                 domain,
-                fields=fields,
-                limit=limit,
-                offset=offset,
-                order=order
+                **search_kwargs
             )
 
-            # Obtener el conteo total sin límite para paginación
-            total_count = odoo.execute_method("sale.order", "search_count", domain)
+            # Obtener el conteo total sin límite para paginación. Si la página no
+            # se llenó y no está vacía (o es la primera), ya es la última: el total
+            # es offset + filas devueltas y no hace falta otra llamada
+            if len(orders) < limit and (orders or not offset):
+                total_count = offset + len(orders)
+            else:
+                total_count = await asyncio.to_thread(
+                    odoo.execute_method, "sale.order", "search_count", domain
+                )
 
             return {
                 "success": True,
@@ -103,7 +262,7 @@ def register_sales_tools(mcp: FastMCP) -> None:
             return {"success": False, "error": str(e)}
     
     @mcp.tool(description="Crear un nuevo pedido de venta")
-    def create_sales_order(
+    async def create_sales_order(
         partner_id: int,
         order_lines: List[Dict[str, Any]],
         date_order: Optional[str] = None
@@ -122,7 +281,7 @@ def register_sales_tools(mcp: FastMCP) -> None:
         Returns:
             Respuesta con el resultado de la operación
         """
-        odoo = _get_odoo()
+        odoo = await asyncio.to_thread(get_odoo_client)
 
         try:
             # Preparar valores para el pedido
@@ -133,41 +292,34 @@ def register_sales_tools(mcp: FastMCP) -> None:
 
             if date_order:
                 try:
-                    datetime.strptime(date_order, "%Y-%m-%d")
+                    parse_date(date_order)
                     order_vals["date_order"] = date_order
                 except ValueError:
                     return {"success": False, "error": f"Formato de fecha inválido: {date_order}. Use YYYY-MM-DD."}
 
-            # Preparar líneas de pedido
+            # Validar todas las líneas antes de construir los comandos
             for line in order_lines:
                 if not isinstance(line, dict):
                     return {"success": False, "error": "Cada línea debe ser un diccionario"}
 
-                if "product_id" not in line or "product_uom_qty" not in line:
+                if not _REQUIRED_LINE_KEYS.issubset(line):
                     return {"success": False, "error": "Cada línea debe contener product_id y product_uom_qty"}
 
-                line_vals = [
-                    0, 0, {
-                        "product_id": line["product_id"],
-                        "product_uom_qty": line["product_uom_qty"]
-                    }
-                ]
+            # Comandos x2many (0, 0, vals): crear cada línea junto con el pedido
+            order_vals["order_line"] = [_line_command(line) for line in order_lines]
 
-                if "price_unit" in line and line["price_unit"] is not None:
-                    line_vals[2]["price_unit"] = line["price_unit"]
-
-                order_vals["order_line"].append(line_vals)
-
-            # Crear pedido
-            order_id = odoo.execute_method("sale.order", "create", order_vals)
+            # Crear pedido y obtener su nombre (una sola llamada si el servidor lo permite)
+            order_info = await asyncio.to_thread(
+                odoo.create_and_read, "sale.order", order_vals, ["name"]
+            )
 
-            # Obtener información del pedido creado
-            order_info = odoo.execute_method("sale.order", "read", [order_id], ["name"])[0]
+            # Un pedido nuevo cambia los totales: descartar los análisis en caché
+            _perf_cache.clear()
 
             return {
                 "success": True,
                 "result": {
-                    "order_id": order_id,
+                    "order_id": order_info["id"],
                     "order_name": order_info["name"]
                 }
             }
@@ -176,10 +328,11 @@ def register_sales_tools(mcp: FastMCP) -> None:
             return {"success": False, "error": str(e)}
     
     @mcp.tool(description="Analiza el rendimiento de ventas en un período")
-    def analyze_sales_performance(
+    async def analyze_sales_performance(
         date_from: str,
         date_to: str,
-        group_by: Optional[str] = None
+        group_by: Optional[str] = None,
+        compare: bool = True
     ) -> Dict[str, Any]:
         """
         Analiza el rendimiento de ventas en un período específico
@@ -188,158 +341,82 @@ def register_sales_tools(mcp: FastMCP) -> None:
             date_from: Fecha inicial en formato YYYY-MM-DD
             date_to: Fecha final en formato YYYY-MM-DD
             group_by: Agrupar resultados por 'product', 'customer', o 'salesperson' (opcional)
+            compare: Comparar con el período anterior de la misma duración; con False
+                no se consulta y previous_period y percent_change son None (default: True)
 
         Returns:
             Diccionario con resultados del análisis
         """
-        odoo = _get_odoo()
+        odoo = await asyncio.to_thread(get_odoo_client)
 
         try:
             # Validar fechas
             try:
-                datetime.strptime(date_from, "%Y-%m-%d")
-                datetime.strptime(date_to, "%Y-%m-%d")
+                date_from_dt = parse_date(date_from)
+                date_to_dt = parse_date(date_to)
             except ValueError:
                 return {"success": False, "error": "Formato de fecha inválido. Use YYYY-MM-DD."}
 
-            # Construir dominio para pedidos confirmados
+            # Devolver el resultado en caché si sigue vigente
+            cache_key = (date_from, date_to, group_by, compare)
+            now = time.monotonic()
+            cached = cached_response(_perf_cache, cache_key, now)
+            if cached is not None:
+                return cached
+
+            # Construir dominio para pedidos confirmados. date_order es Datetime:
+            # límites completos del día para incluir los pedidos del último día
+            period_start = f"{date_from} 00:00:00"
+            period_end = f"{date_to} 23:59:59"
             domain = [
-                ("date_order", ">=", date_from),
-                ("date_order", "<=", date_to),
+                ("date_order", ">=", period_start),
+                ("date_order", "<=", period_end),
                 ("state", "in", ["sale", "done"])
             ]
             
-            # Obtener datos de ventas
-            sales_data = odoo.search_read(
-                "sale.order",
-                domain,
-                fields=["name", "partner_id", "date_order", "amount_total", "user_id"]
-            )
-
             # Calcular período anterior para comparación
-            date_from_dt = datetime.strptime(date_from, "%Y-%m-%d")
-            date_to_dt = datetime.strptime(date_to, "%Y-%m-%d")
             delta = date_to_dt - date_from_dt
 
             prev_date_to = date_from_dt - timedelta(days=1)
             prev_date_from = prev_date_to - delta
             
-            prev_domain = [
-                ("date_order", ">=", prev_date_from.strftime("%Y-%m-%d")),
-                ("date_order", "<=", prev_date_to.strftime("%Y-%m-%d")),
-                ("state", "in", ["sale", "done"])
-            ]
-            
-            prev_sales_data = odoo.search_read(
-                "sale.order",
-                prev_domain,
-                fields=["amount_total"]
-            )
+            # Consulta de agrupación según el parámetro group_by (GROUP BY en el servidor)
+            grouping = _GROUPINGS.get(group_by)
             
-            # Calcular totales
-            current_total = sum(order["amount_total"] for order in sales_data)
-            previous_total = sum(order["amount_total"] for order in prev_sales_data)
+            # Totales de ambos períodos (SUM y COUNT sin agrupar) y agrupación en
+            # paralelo: son consultas independientes. Sin comparación no se
+            # consulta el período anterior
+            queries = [asyncio.to_thread(_sum_orders, odoo, domain)]
+            if compare:
+                prev_domain = [
+                    ("date_order", ">=", f"{prev_date_from.isoformat()} 00:00:00"),
+                    ("date_order", "<=", f"{prev_date_to.isoformat()} 23:59:59"),
+                    ("state", "in", ["sale", "done"])
+                ]
+                queries.append(asyncio.to_thread(_sum_orders, odoo, prev_domain))
+            if grouping is not None:
+                queries.append(asyncio.to_thread(_read_groups, odoo, grouping, domain))
+            results = await asyncio.gather(*queries)
+            current_count, current_total = results[0]
+            previous_count, previous_total = results[1] if compare else (0, 0)
             
             # Calcular cambio porcentual
             percent_change = 0
             if previous_total > 0:
                 percent_change = ((current_total - previous_total) / previous_total) * 100
             
-            # Agrupar según el parámetro group_by
+            previous_period = None
+            if compare:
+                previous_period = {
+                    "from": prev_date_from.isoformat(),
+                    "to": prev_date_to.isoformat(),
+                    "order_count": previous_count,
+                    "total_amount": previous_total
+                }
+            
             grouped_data = {}
-            if group_by:
-                if group_by == "product":
-                    # Obtener líneas de pedido para analizar productos
-                    order_ids = [order["id"] for order in sales_data]
-                    if order_ids:
-                        order_lines = odoo.search_read(
-                            "sale.order.line",
-                            [("order_id", "in", order_ids)],
-                            fields=["product_id", "product_uom_qty", "price_subtotal"]
-                        )
-                        
-                        # Agrupar por producto
-                        product_data = {}
-                        for line in order_lines:
-                            product_id = line["product_id"][0] if line["product_id"] else 0
-                            product_name = line["product_id"][1] if line["product_id"] else "Desconocido"
-                            
-                            if product_id not in product_data:
-                                product_data[product_id] = {
-                                    "name": product_name,
-                                    "quantity": 0,
-                                    "amount": 0
-                                }
-                            
-                            product_data[product_id]["quantity"] += line["product_uom_qty"]
-                            product_data[product_id]["amount"] += line["price_subtotal"]
-                        
-                        # Ordenar por monto
-                        top_products = sorted(
-                            product_data.items(),
-                            key=lambda x: x[1]["amount"],
-                            reverse=True
-                        )
-                        
-                        grouped_data["products"] = [
-                            {"id": k, **v} for k, v in top_products[:10]
-                        ]
-                
-                elif group_by == "customer":
-                    # Agrupar por cliente
-                    customer_data = {}
-                    for order in sales_data:
-                        customer_id = order["partner_id"][0] if order["partner_id"] else 0
-                        customer_name = order["partner_id"][1] if order["partner_id"] else "Desconocido"
-                        
-                        if customer_id not in customer_data:
-                            customer_data[customer_id] = {
-                                "name": customer_name,
-                                "order_count": 0,
-                                "amount": 0
-                            }
-                        
-                        customer_data[customer_id]["order_count"] += 1
-                        customer_data[customer_id]["amount"] += order["amount_total"]
-                    
-                    # Ordenar por monto
-                    top_customers = sorted(
-                        customer_data.items(),
-                        key=lambda x: x[1]["amount"],
-                        reverse=True
-                    )
-                    
-                    grouped_data["customers"] = [
-                        {"id": k, **v} for k, v in top_customers[:10]
-                    ]
-                
-                elif group_by == "salesperson":
-                    # Agrupar por vendedor
-                    salesperson_data = {}
-                    for order in sales_data:
-                        salesperson_id = order["user_id"][0] if order["user_id"] else 0
-                        salesperson_name = order["user_id"][1] if order["user_id"] else "Desconocido"
-                        
-                        if salesperson_id not in salesperson_data:
-                            salesperson_data[salesperson_id] = {
-                                "name": salesperson_name,
-                                "order_count": 0,
-                                "amount": 0
-                            }
-                        
-                        salesperson_data[salesperson_id]["order_count"] += 1
-                        salesperson_data[salesperson_id]["amount"] += order["amount_total"]
-                    
-                    # Ordenar por monto
-                    top_salespersons = sorted(
-                        salesperson_data.items(),
-                        key=lambda x: x[1]["amount"],
-                        reverse=True
-                    )
-                    
-                    grouped_data["salespersons"] = [
-                        {"id": k, **v} for k, v in top_salespersons
-                    ]
+            if grouping is not None and (current_count or not grouping.skip_if_empty):
+                grouped_data[grouping.result_key] = results[-1]
             
             # Preparar resultado
             result = {
@@ -348,15 +425,10 @@ def register_sales_tools(mcp: FastMCP) -> None:
                     "to": date_to
                 },
                 "summary": {
-                    "order_count": len(sales_data),
+                    "order_count": current_count,
                     "total_amount": current_total,
-                    "previous_period": {
-                        "from": prev_date_from.strftime("%Y-%m-%d"),
-                        "to": prev_date_to.strftime("%Y-%m-%d"),
-                        "order_count": len(prev_sales_data),
-                        "total_amount": previous_total
-                    },
-                    "percent_change": round(percent_change, 2)
+                    "previous_period": previous_period,
+                    "percent_change": round(percent_change, 2) if compare else None
                 }
             }
             
@@ -364,7 +436,9 @@ def register_sales_tools(mcp: FastMCP) -> None:
             if grouped_data:
                 result["grouped_data"] = grouped_data
             
-            return {"success": True, "result": result}
+            response = {"success": True, "result": result}
+            _cache_perf_response(cache_key, now, response)
+            return response
             
         except Exception as e:
             return {"success": False, "error": str(e)}
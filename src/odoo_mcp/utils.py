@@ -0,0 +1,79 @@
+"""
+Helpers shared by the Odoo MCP tool modules
+"""
+
+import copy
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+
+# The same period dates repeat across tool calls, so parsed values are
+# memoized (lru_cache does not store exceptions, so invalid dates are always
+# checked again)
+@lru_cache(maxsize=256)
+def parse_date(value: str) -> date:
+    """Parse a strict YYYY-MM-DD date (much cheaper than datetime.strptime)
+
+    Raises:
+        ValueError: if value is not a valid date in exactly that format
+    """
+    # Fixed-position check (dashes at 4 and 7, ASCII digits elsewhere) before
+    # date.fromisoformat, which is implemented in C
+    if len(value) != 10 or value[4] != "-" or value[7] != "-":
+        raise ValueError(f"Invalid date format: {value!r}")
+    digits = value[:4] + value[5:7] + value[8:]
+    if not (digits.isascii() and digits.isdigit()):
+        raise ValueError(f"Invalid date format: {value!r}")
+    return date.fromisoformat(value)
+
+
+def cache_response(
+    cache: Dict[tuple, tuple],
+    key: tuple,
+    now: float,
+    ttl: float,
+    response: Dict[str, Any],
+    max_size: int,
+) -> None:
+    """
+    Store a tool response in a TTL cache of (expires, response) entries
+
+    A deep copy is stored, so changes the caller makes to the response it
+    returns do not reach the cache. When the cache is full, expired entries
+    are dropped first; if that is not enough, the whole cache is cleared.
+
+    Args:
+        cache: Dictionary mapping keys to (expires, response) tuples
+        key: Cache key of the response
+        now: Current time.monotonic() value
+        ttl: Seconds the response stays valid
+        response: Tool response to store
+        max_size: Maximum number of entries kept in the cache
+    """
+    if len(cache) >= max_size:
+        for expired in [k for k, (expires, _r) in cache.items() if expires <= now]:
+            del cache[expired]
+        if len(cache) >= max_size:
+            cache.clear()
+    cache[key] = (now + ttl, copy.deepcopy(response))
+
+
+def cached_response(
+    cache: Dict[tuple, tuple], key: tuple, now: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Return a copy of a cached tool response, or None if missing or expired
+
+    Each hit gets its own deep copy, so a caller that mutates the result
+    cannot corrupt later hits.
+
+    Args:
+        cache: Dictionary mapping keys to (expires, response) tuples
+        key: Cache key of the response
+        now: Current time.monotonic() value
+    """
+    entry = cache.get(key)
+    if entry is None or entry[0] <= now:
+        return None
+    return copy.deepcopy(entry[1])